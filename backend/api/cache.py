@@ -0,0 +1,147 @@
+"""Кэш справочных данных API."""
+import hashlib
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+from .serializers import IngredientSerializer, TagSerializer
+from .versions import bump_version, get_version, get_versions
+
+
+class ReferenceCache:
+    """Справочник, хранимый в виде готовых JSON-байтов.
+
+    Байты и их ETag лежат в памяти процесса и в кэше Django под ключом
+    текущей версии, поэтому повторные запросы не обращаются к базе
+    и не сериализуют данные заново.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._local = None
+
+    def get(self):
+        """Метод получения пары (etag, content) актуальной версии"""
+        version = get_version(self.name)
+        local = self._local
+        if local is not None and local[0] == version:
+            return local[1]
+        key = f'reference:{self.name}:{version}'
+        cached = cache.get(key)
+        if cached is None:
+            content = JSONRenderer().render(
+                self.serializer_class(self.queryset.all(), many=True).data)
+            cached = (f'"{hashlib.md5(content).hexdigest()}"', content)
+            cache.set(key, cached, None)
+        self._local = (version, cached)
+        return cached
+
+    def invalidate(self):
+        """Метод сброса кэша после изменения справочника"""
+        bump_version(self.name)
+
+
+tags_cache = ReferenceCache('tags', Tag.objects.all(), TagSerializer)
+ingredients_cache = ReferenceCache(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer)
+
+
+class ResponseCache:
+    """Кэш готовых JSON-ответов списка для анонимных запросов.
+
+    Ключ строится из нормализованных параметров запроса и версий
+    наборов данных, поэтому смена любой версии делает устаревшими все
+    сохранённые страницы. Число попаданий и промахов копится в памяти
+    процесса и переносится в кэш не чаще раза в stats_interval секунд.
+    """
+
+    stats_interval = 30
+
+    def __init__(self, name, version_names, timeout):
+        self.name = name
+        self.version_names = (name, *version_names)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._flushed = time.monotonic()
+
+    def get_key(self, request):
+        """Ключ кэша для запроса"""
+        params = urlencode(sorted(
+            (key, value) for key in request.query_params
+            for value in request.query_params.getlist(key)))
+        versions = ':'.join(
+            str(version) for version in get_versions(*self.version_names))
+        digest = hashlib.md5(
+            f'{request.scheme}://{request.get_host()}?{params}'.encode()
+        ).hexdigest()
+        return f'response:{self.name}:{versions}:{digest}'
+
+    def count(self, event):
+        """Метод увеличения счётчика попаданий или промахов процесса"""
+        with self._lock:
+            self._counts[event] += 1
+            if time.monotonic() - self._flushed < self.stats_interval:
+                return
+        self.flush()
+
+    def flush(self):
+        """Метод переноса накопленных в процессе счётчиков в кэш"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed = time.monotonic()
+        for event, value in counts.items():
+            key = f'response:{self.name}:{event}'
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+    def get_response(self, request, build_response):
+        """Ответ из кэша или от build_response с сохранением в кэш"""
+        key = self.get_key(request)
+        content = cache.get(key)
+        if content is None:
+            self.count('misses')
+            response = build_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, self.timeout)
+            event = 'MISS'
+        else:
+            self.count('hits')
+            event = 'HIT'
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = event
+        return response
+
+    def get_stats(self):
+        """Число попаданий и промахов кэша"""
+        self.flush()
+        stats = cache.get_many([f'response:{self.name}:hits',
+                                f'response:{self.name}:misses'])
+        hits = stats.get(f'response:{self.name}:hits', 0)
+        misses = stats.get(f'response:{self.name}:misses', 0)
+        return {'hits': hits, 'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0}
+
+    def invalidate(self):
+        """Метод сброса сохранённых ответов"""
+        bump_version(self.name)
+
+
+recipe_feed_cache = ResponseCache(
+    'recipe_feed', ('recipes', 'tags', 'ingredients'),
+    settings.RECIPE_FEED_CACHE_TIMEOUT)
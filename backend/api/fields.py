@@ -0,0 +1,118 @@
+import base64
+import binascii
+import hashlib
+import posixpath
+import re
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+DECODE_CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'\s')
+
+
+class RecipeImageField(Base64ImageField):
+    """Поле изображения рецепта в base64.
+
+    Строка декодируется частями во временный файл, который остаётся
+    в памяти только до RECIPE_IMAGE_SPOOL_SIZE. Размер в байтах
+    проверяется до декодирования, формат и размер в пикселях - по
+    заголовку первой части. Если присланы те же байты, что уже сохранены
+    у рецепта, возвращается текущий файл без повторной записи.
+    """
+
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'too_large': ('Размер изображения не должен превышать '
+                      '{max_bytes} байт.'),
+        'too_many_pixels': ('Изображение не должно содержать больше '
+                            '{max_pixels} пикселей.'),
+        'invalid_type': 'Допустимые форматы изображения: JPEG, PNG, GIF.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_image')
+        header, _, base64_data = data.rpartition(';base64,')
+        if WHITESPACE.search(base64_data):
+            base64_data = ''.join(base64_data.split())
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        if len(base64_data) // 4 * 3 > max_bytes + 2:
+            self.fail('too_large', max_bytes=max_bytes)
+        image_file, digest = self.decode(base64_data)
+        instance = getattr(self.parent, 'instance', None)
+        if instance is not None and instance.image and digest == (
+                posixpath.splitext(
+                    posixpath.basename(instance.image.name))[0]):
+            image_file.close()
+            return instance.image
+        return self.verify(image_file, digest, header.replace('data:', ''))
+
+    def decode(self, base64_data):
+        """Метод декодирования base64 частями во временный файл"""
+        image_file = SpooledTemporaryFile(
+            max_size=settings.RECIPE_IMAGE_SPOOL_SIZE)
+        digest = hashlib.sha256()
+        try:
+            for start in range(0, len(base64_data), DECODE_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    base64_data[start:start + DECODE_CHUNK_SIZE],
+                    validate=True)
+                if not start:
+                    self.check_header(chunk)
+                digest.update(chunk)
+                image_file.write(chunk)
+        except (binascii.Error, ValueError):
+            image_file.close()
+            self.fail('invalid_image')
+        except ValidationError:
+            image_file.close()
+            raise
+        image_file.seek(0)
+        return image_file, digest.hexdigest()
+
+    def check_header(self, chunk):
+        """Метод проверки формата и размеров по началу файла"""
+        try:
+            with Image.open(BytesIO(chunk)) as image:
+                image_format, size = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            return
+        self.check_image(image_format, size)
+
+    def check_image(self, image_format, size):
+        if image_format not in IMAGE_EXTENSIONS:
+            self.fail('invalid_type')
+        max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        if size[0] * size[1] > max_pixels:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+
+    def verify(self, image_file, digest, content_type):
+        """Метод полной проверки изображения перед сохранением"""
+        try:
+            with Image.open(image_file) as image:
+                self.check_image(image.format, image.size)
+                image_format = image.format
+                image.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            image_file.close()
+            self.fail('invalid_image')
+        except ValidationError:
+            image_file.close()
+            raise
+        size = image_file.seek(0, 2)
+        image_file.seek(0)
+        return UploadedFile(
+            file=image_file,
+            name=f'{digest}.{IMAGE_EXTENSIONS[image_format]}',
+            content_type=content_type or None,
+            size=size,
+        )
@@ -1,6 +1,10 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag, User
+from recipes.models import (TAGS_MASK_BITS, Favorite, Ingredient, Recipe,
+                            Tag, TagRecipe, User, get_tags_mask)
+from shopping_cart.models import ShoppingCart
+from .search import search_recipes
 
 
 class IngredientFilter(FilterSet):
@@ -13,6 +17,13 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
 
+RECIPE_ORDERING = {
+    'popular': ('-popularity_score', '-pub_date'),
+    'trending': ('-trending_score', '-pub_date'),
+    'cooking_time': ('cooking_time', '-pub_date'),
+}
+
+
 class RecipeFilter(FilterSet):
     """Фильтр для рецептов"""
 
@@ -21,23 +32,56 @@ class RecipeFilter(FilterSet):
         queryset=Tag.objects.all(),
         field_name='tags__slug',
         to_field_name='slug',
+        method='get_tags',
     )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(key, key) for key in RECIPE_ORDERING],
+        method='get_ordering')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
 
+    def get_tags(self, queryset, name, value):
+        """Метод фильтрации рецептов, у которых есть любой из тегов.
+
+        Если все теги попадают в битовую маску, фильтр обходится без
+        соединений, иначе используется подзапрос EXISTS по TagRecipe.
+        """
+        if not value:
+            return queryset
+        tag_ids = [tag.id for tag in value]
+        if max(tag_ids) < TAGS_MASK_BITS:
+            return queryset.alias(
+                tags_match=F('tags_mask').bitand(get_tags_mask(tag_ids)),
+            ).filter(tags_match__gt=0)
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+
     def get_is_favorited(self, queryset, name, value):
         """Метод для фильтрации избранных рецептов"""
         if self.request.user.is_authenticated and value == 1:
-            return queryset.filter(recipe_in_favorite__user=self.request.user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk'))))
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         """Метод для фильтрации рецептов в корзине"""
         if self.request.user.is_authenticated and value == 1:
-            return queryset.filter(recipe_cart__user=self.request.user)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk'))))
         return queryset
+
+    def get_search(self, queryset, name, value):
+        """Метод полнотекстового поиска по названию, описанию
+           и ингредиентам
+        """
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        """Метод сортировки по рейтингу или времени приготовления"""
+        return queryset.order_by(*RECIPE_ORDERING[value])
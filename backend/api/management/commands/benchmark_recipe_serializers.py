@@ -0,0 +1,127 @@
+import json
+import logging
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.querysets import get_recipe_feed
+from api.serializers import RecipeRowsSerializer, RecipeSerializer
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe)
+from users.models import User
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+def to_json(data):
+    """JSON-представление рецептов в том виде, в каком его получит клиент"""
+    return json.loads(JSONRenderer().render(data))
+
+
+class Command(BaseCommand):
+    """Команда для сверки и сравнения скорости RecipeSerializer и
+       RecipeRowsSerializer на одной странице рецептов
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Размер страницы рецептов')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--user', help='Email пользователя для признаков')
+        parser.add_argument('--generate', action='store_true',
+                            help='Создать недостающие рецепты во временной '
+                                 'транзакции, которая будет отменена')
+
+    def generate(self, count):
+        """Метод создания недостающих рецептов для замера"""
+        missing = count - Recipe.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(
+            email='benchmark@example.com',
+            defaults={'username': 'benchmark', 'first_name': 'Бенчмарк',
+                      'last_name': 'Бенчмарк'})
+        tag = Tag.objects.first() or Tag.objects.create(
+            name='Бенчмарк', color='#000000', slug='benchmark')
+        ingredients = list(Ingredient.objects.all()[:5]) or [
+            Ingredient.objects.create(name='бенчмарк', measurement_unit='г')]
+        Recipe.objects.bulk_create([
+            Recipe(author=author, name=f'Рецепт {number}',
+                   text='Описание рецепта ' * 20, cooking_time=number % 90 + 1)
+            for number in range(missing)
+        ], batch_size=1000)
+        recipe_ids = list(Recipe.objects.filter(
+            author=author).values_list('id', flat=True))
+        TagRecipe.objects.bulk_create(
+            [TagRecipe(recipe_id=pk, tag=tag) for pk in recipe_ids],
+            batch_size=1000, ignore_conflicts=True)
+        IngredientRecipe.objects.bulk_create(
+            [IngredientRecipe(recipe_id=pk, ingredient=ingredient, amount=10)
+             for pk in recipe_ids for ingredient in ingredients],
+            batch_size=1000, ignore_conflicts=True)
+
+    def get_context(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return {'request': request}
+
+    def serialize_models(self, queryset, user):
+        return RecipeSerializer(
+            list(queryset), many=True, context=self.get_context(user)).data
+
+    def serialize_rows(self, queryset, user):
+        return RecipeRowsSerializer(
+            list(queryset.prefetch_related(None).values(
+                *RecipeRowsSerializer.FIELDS)),
+            context=self.get_context(user)).data
+
+    def measure(self, serialize, queryset, user, repeat):
+        """Лучшее время из repeat запусков в миллисекундах"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            serialize(queryset, user)
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['generate']:
+                self.generate(options['recipes'])
+            if options['user']:
+                user = User.objects.get(email=options['user'])
+            else:
+                user = User.objects.order_by('id').first()
+            queryset = get_recipe_feed().order_by(
+                '-pub_date', '-id')[:options['recipes']]
+            models_data = to_json(self.serialize_models(queryset, user))
+            rows_data = to_json(self.serialize_rows(queryset, user))
+            mismatches = [
+                (expected, actual)
+                for expected, actual in zip(models_data, rows_data)
+                if expected != actual
+            ]
+            if len(models_data) != len(rows_data):
+                raise CommandError(
+                    f'Разное число рецептов: {len(models_data)} '
+                    f'и {len(rows_data)}')
+            if mismatches:
+                expected, actual = mismatches[0]
+                raise CommandError(
+                    f'Расхождений: {len(mismatches)}, первое:\n'
+                    f'{expected}\n{actual}')
+            logging.info(f'Ответы совпадают для {len(models_data)} рецептов')
+            models_time = self.measure(
+                self.serialize_models, queryset, user, options['repeat'])
+            rows_time = self.measure(
+                self.serialize_rows, queryset, user, options['repeat'])
+            logging.info(
+                f'RecipeSerializer: {models_time:.1f} мс, '
+                f'RecipeRowsSerializer: {rows_time:.1f} мс, '
+                f'ускорение {models_time / max(rows_time, 1e-6):.1f}x')
+            if options['generate']:
+                transaction.set_rollback(True)
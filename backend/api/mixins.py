@@ -1,4 +1,6 @@
-"""Миксин для операций с корзиной."""
+"""Миксины для вью."""
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 from rest_framework import status
 
 from recipes.models import Favorite
@@ -73,3 +75,22 @@ class ItemManagementMixin:
                                 'recipe',
                                 recipe_id,
                                 'Рецепт успешно удален из избранного')
+
+
+class CachedReferenceMixin:
+    """Отдача списка справочника из ReferenceCache с поддержкой ETag"""
+
+    reference_cache = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        etag, content = self.reference_cache.get()
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -1,8 +1,123 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db import connections
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .filters import RECIPE_ORDERING
+
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def get_count(queryset):
+    """Число записей queryset.
+
+    Для неотфильтрованной таблицы в PostgreSQL берётся оценка
+    pg_class.reltuples, если она достаточно велика, чтобы точный
+    COUNT(*) был дорогим.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                (queryset.model._meta.db_table,),
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= EXACT_COUNT_THRESHOLD:
+            return row[0]
+    return queryset.count()
+
+
+class CountedCursorPagination(CursorPagination):
+    """Курсорный пагинатор с необязательным общим числом записей"""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = get_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+            response.data.move_to_end('count', last=False)
+        return response
+
+
+class RecipeCursorPagination(CountedCursorPagination):
+    """Курсорный пагинатор рецептов по (pub_date, id)"""
+
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering')
+        if ordering in RECIPE_ORDERING:
+            return (*RECIPE_ORDERING[ordering], '-id')
+        return self.ordering
+
+
+class SubscriptionCursorPagination(CountedCursorPagination):
+    """Курсорный пагинатор подписок по id подписки"""
+
+    ordering = ('id',)
 
 
 class CustomPagination(PageNumberPagination):
-    """Кастомный пагинатор"""
+    """Кастомный пагинатор.
+
+    При заданном cursor_pagination_class запрос с ?pagination=cursor или
+    ?cursor= обслуживается курсорным пагинатором без COUNT(*) и OFFSET.
+    Если задан один из no_cursor_query_params, порядок выдачи курсору
+    не подходит и остаётся постраничная пагинация.
+    """
 
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_pagination_class = None
+    cursor_mode_query_param = 'pagination'
+    no_cursor_query_params = ()
+
+    def use_cursor(self, request):
+        """Метод выбора курсорной пагинации для запроса"""
+        if self.cursor_pagination_class is None or any(
+                request.query_params.get(param)
+                for param in self.no_cursor_query_params):
+            return False
+        return (request.query_params.get(
+                self.cursor_mode_query_param) == 'cursor'
+                or self.cursor_pagination_class.cursor_query_param
+                in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(CustomPagination):
+    """Пагинатор рецептов.
+
+    Результаты ?search= упорядочены по релевантности, которую курсор по
+    (pub_date, id) не сохраняет, поэтому поиск всегда постраничный.
+    """
+
+    cursor_pagination_class = RecipeCursorPagination
+    no_cursor_query_params = ('search',)
+
+
+class SubscriptionPagination(CustomPagination):
+    """Пагинатор подписок"""
+
+    cursor_pagination_class = SubscriptionCursorPagination
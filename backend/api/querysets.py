@@ -0,0 +1,55 @@
+"""Построители querysets для выдачи рецептов."""
+from collections import defaultdict
+
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import IngredientRecipe, Recipe, Tag
+
+
+def get_recipe_feed():
+    """Queryset рецептов с подгруженными связями.
+
+    Автор, теги и ингредиенты загружаются заранее, поэтому страница
+    любого размера собирается за постоянное число запросов; признаки
+    избранного, корзины и подписки берутся из UserRelations. Теги и
+    ингредиенты упорядочены так же, как в RecipeRowsSerializer.
+    """
+    return Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch(
+            'recipe_from_ingredient',
+            queryset=IngredientRecipe.objects.select_related(
+                'ingredient').order_by('id'),
+        ),
+    )
+
+
+def get_author_recipes(author_ids, limit=None):
+    """Рецепты авторов, сгруппированные по id автора.
+
+    Все рецепты страницы подписок загружаются одним запросом; при заданном
+    limit у каждого автора остаются последние limit рецептов, отобранные
+    оконной функцией ROW_NUMBER() OVER (PARTITION BY author).
+    """
+    queryset = Recipe.objects.filter(author_id__in=author_ids).only(
+        'id', 'author_id', 'name', 'image', 'image_renditions',
+        'cooking_time', 'pub_date')
+    if limit is None:
+        recipes = queryset.order_by('author_id', '-pub_date')
+    else:
+        ranked = queryset.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc(),
+        )).order_by()
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+            'ORDER BY author_id, recipe_rank',
+            (*params, limit),
+        )
+    author_recipes = defaultdict(list)
+    for recipe in recipes:
+        author_recipes[recipe.author_id].append(recipe)
+    return author_recipes
@@ -0,0 +1,72 @@
+"""Связи текущего пользователя с рецептами и авторами."""
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Favorite, Subscription
+from shopping_cart.models import ShoppingCart
+from .versions import bump_version, get_version
+
+RELATIONS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'cart': (ShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscription, 'author_id'),
+}
+RELATIONS_VERSION = 'relations:{}:{}'
+RELATIONS_KEY = 'relations:{}:{}:{}'
+RELATIONS_TIMEOUT = 5 * 60
+
+
+class UserRelations:
+    """Множества id избранного, корзины и подписок пользователя.
+
+    Каждое множество загружается одним запросом при первом обращении
+    и хранится в кэше Django под ключом версии связи пользователя.
+    Изменение связи не правит сохранённое множество, а меняет версию
+    после фиксации транзакции, поэтому множество, загруженное до
+    изменения, больше не читается. Признаки в ответах сводятся
+    к проверке вхождения в множество.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._sets = {}
+
+    def get(self, kind):
+        """Множество id для вида связи kind"""
+        if self.user.is_anonymous:
+            return frozenset()
+        if kind not in self._sets:
+            version = get_version(RELATIONS_VERSION.format(
+                self.user.id, kind))
+            key = RELATIONS_KEY.format(self.user.id, kind, version)
+            ids = cache.get(key)
+            if ids is None:
+                model, field = RELATIONS[kind]
+                ids = frozenset(model.objects.filter(
+                    user=self.user).values_list(field, flat=True))
+                cache.set(key, ids, RELATIONS_TIMEOUT)
+            self._sets[kind] = ids
+        return self._sets[kind]
+
+    def contains(self, kind, pk):
+        return pk in self.get(kind)
+
+
+def get_user_relations(context):
+    """Связи пользователя запроса, общие для всех сериалайзеров запроса"""
+    request = context.get('request')
+    if request is None:
+        return None
+    if not hasattr(request, 'user_relations'):
+        request.user_relations = UserRelations(request.user)
+    return request.user_relations
+
+
+def invalidate_user_relations(user_id, kind):
+    """Метод смены версии связей пользователя после фиксации транзакции.
+
+    Вызывается только при изменении связей: закешированное множество
+    не исправляется, а перечитывается целиком.
+    """
+    transaction.on_commit(
+        lambda: bump_version(RELATIONS_VERSION.format(user_id, kind)))
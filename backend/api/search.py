@@ -0,0 +1,293 @@
+"""Поиск по ингредиентам и рецептам."""
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, When
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from .versions import get_version, get_versions, incr_version
+
+SEARCH_CONFIG = 'russian'
+
+RECIPE_SEARCH_VECTOR_SQL = f"""
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', text), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe AS recipe_ingredient
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = recipe_ingredient.ingredient_id
+            WHERE recipe_ingredient.recipe_id = recipes_recipe.id
+        ), '')), 'C')
+    WHERE id = ANY(%s)
+"""
+
+WORD = re.compile(r'\w+')
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов для автодополнения.
+
+    Названия хранятся отсортированным списком в нижнем регистре, поиск
+    по префиксу выполняется бинарным поиском. Индекс перестраивается,
+    когда меняется версия справочника ингредиентов.
+    """
+
+    version_name = 'ingredients'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = (None, [], array('q'), {})
+
+    def load(self):
+        """Метод загрузки индекса актуальной версии"""
+        version = get_version(self.version_name)
+        if self._snapshot[0] == version:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot[0] != version:
+                rows = sorted(
+                    (name.casefold(), pk, name, measurement_unit)
+                    for pk, name, measurement_unit
+                    in Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit').iterator()
+                )
+                self._snapshot = (
+                    version,
+                    [row[0] for row in rows],
+                    array('q', (row[1] for row in rows)),
+                    {row[1]: {'id': row[1], 'name': row[2],
+                              'measurement_unit': row[3]} for row in rows},
+                )
+        return self._snapshot
+
+    def search(self, query, contains=False):
+        """Метод поиска ингредиентов по началу названия.
+
+        При contains=True после совпадений по префиксу идут названия,
+        содержащие query в середине.
+        """
+        _, keys, ids, rows = self.load()
+        query = query.strip().casefold()
+        found = []
+        for position in range(bisect_left(keys, query), len(keys)):
+            if not keys[position].startswith(query):
+                break
+            found.append(ids[position])
+        if contains and query:
+            found.extend(
+                ids[position] for position, key in enumerate(keys)
+                if query in key and not key.startswith(query)
+            )
+        return [rows[pk] for pk in found]
+
+    def get_missing(self, ingredient_ids):
+        """Метод получения id, которых нет в справочнике ингредиентов"""
+        rows = self.load()[3]
+        return {pk for pk in ingredient_ids if pk not in rows}
+
+
+ingredient_index = IngredientIndex()
+
+
+def update_search_vectors(recipe_ids):
+    """Метод обновления tsvector рецептов по названию, описанию и
+       ингредиентам одним запросом
+    """
+    if connection.vendor == 'postgresql' and recipe_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(RECIPE_SEARCH_VECTOR_SQL, (list(recipe_ids),))
+
+
+def update_search_vector(recipe_id):
+    """Метод обновления tsvector одного рецепта"""
+    update_search_vectors([recipe_id])
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс рецептов для баз без полнотекстового поиска.
+
+    Используется вместо tsvector при запуске на SQLite. Слова ищутся по
+    префиксу, совпадение в названии весит больше, чем в описании
+    и ингредиентах.
+    """
+
+    weights = {'name': 1.0, 'text': 0.4, 'ingredients': 0.2}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = (None, [], {})
+
+    def get_version(self):
+        return get_versions('recipes', 'ingredients')
+
+    def load(self):
+        """Метод загрузки индекса актуальной версии"""
+        version = self.get_version()
+        if self._snapshot[0] == version:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot[0] != version:
+                postings = defaultdict(lambda: defaultdict(float))
+                ingredients = defaultdict(list)
+                for recipe_id, name in IngredientRecipe.objects.values_list(
+                        'recipe_id', 'ingredient__name').iterator():
+                    ingredients[recipe_id].append(name)
+                for recipe_id, name, text in Recipe.objects.values_list(
+                        'id', 'name', 'text').iterator():
+                    fields = {'name': name, 'text': text,
+                              'ingredients': ' '.join(ingredients[recipe_id])}
+                    for field, value in fields.items():
+                        for word in set(WORD.findall(value.casefold())):
+                            postings[word][recipe_id] += self.weights[field]
+                self._snapshot = (version, sorted(postings), postings)
+        return self._snapshot
+
+    def search(self, query):
+        """Метод поиска рецептов, содержащих все слова запроса.
+
+        Возвращает id рецептов по убыванию релевантности.
+        """
+        _, words, postings = self.load()
+        scores = None
+        for term in set(WORD.findall(query.casefold())):
+            term_scores = defaultdict(float)
+            for position in range(bisect_left(words, term), len(words)):
+                if not words[position].startswith(term):
+                    break
+                for recipe_id, weight in postings[words[position]].items():
+                    term_scores[recipe_id] += weight
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {recipe_id: score + term_scores[recipe_id]
+                          for recipe_id, score in scores.items()
+                          if recipe_id in term_scores}
+        if not scores:
+            return []
+        return sorted(scores, key=lambda recipe_id: -scores[recipe_id])
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс ингредиент -> рецепты.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта - массив id его ингредиентов. Подбор рецептов по
+    набору продуктов сводится к пересечению массивов в памяти без
+    GROUP BY по таблице связей. Изменение ингредиентов рецепта
+    увеличивает собственный счётчик версии индекса; процесс, чей индекс
+    был актуален до этого изменения, обновляет его точечно, остальные
+    перестраивают индекс при следующем подборе.
+    """
+
+    version_name = 'recipe_ingredients'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = (None, {}, {})
+
+    def load(self):
+        """Метод загрузки индекса актуальной версии"""
+        version = get_version(self.version_name)
+        if self._snapshot[0] == version:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot[0] != version:
+                postings = defaultdict(lambda: array('L'))
+                recipes = defaultdict(lambda: array('L'))
+                for ingredient_id, recipe_id in (
+                        IngredientRecipe.objects.values_list(
+                            'ingredient_id', 'recipe_id').order_by(
+                                'ingredient_id', 'recipe_id').distinct()
+                        .iterator()):
+                    postings[ingredient_id].append(recipe_id)
+                    recipes[recipe_id].append(ingredient_id)
+                self._snapshot = (version, dict(postings), dict(recipes))
+        return self._snapshot
+
+    def invalidate(self):
+        """Метод сброса индекса во всех процессах"""
+        incr_version(self.version_name)
+
+    def update_recipe(self, recipe_id):
+        """Метод учёта изменения ингредиентов рецепта.
+
+        Версия индекса увеличивается на единицу; индекс процесса
+        обновляется точечно, только если других изменений с его версии
+        не было, иначе он будет перестроен при следующем обращении.
+        """
+        old_version = self._snapshot[0]
+        new_version = incr_version(self.version_name)
+        if old_version is None or new_version != old_version + 1:
+            return
+        ingredient_ids = array('L', sorted(set(
+            IngredientRecipe.objects.filter(recipe_id=recipe_id)
+            .values_list('ingredient_id', flat=True))))
+        with self._lock:
+            version, postings, recipes = self._snapshot
+            if version != old_version:
+                return
+            postings = dict(postings)
+            recipes = dict(recipes)
+            for ingredient_id in recipes.pop(recipe_id, ()):
+                recipe_ids = array('L', postings[ingredient_id])
+                recipe_ids.pop(bisect_left(recipe_ids, recipe_id))
+                postings[ingredient_id] = recipe_ids
+            if ingredient_ids:
+                recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                recipe_ids = array('L', postings.get(ingredient_id, ()))
+                recipe_ids.insert(
+                    bisect_left(recipe_ids, recipe_id), recipe_id)
+                postings[ingredient_id] = recipe_ids
+            self._snapshot = (new_version, postings, recipes)
+
+    def match(self, ingredient_ids, min_coverage=0):
+        """Метод подбора рецептов по имеющимся ингредиентам.
+
+        Возвращает список (id рецепта, покрытие, число совпавших
+        ингредиентов) по убыванию доли имеющихся ингредиентов рецепта.
+        """
+        _, postings, recipes = self.load()
+        matched = defaultdict(int)
+        for ingredient_id in set(ingredient_ids):
+            for recipe_id in postings.get(ingredient_id, ()):
+                matched[recipe_id] += 1
+        found = []
+        for recipe_id, count in matched.items():
+            coverage = count / len(recipes[recipe_id])
+            if coverage >= min_coverage:
+                found.append((recipe_id, coverage, count))
+        found.sort(key=lambda item: (-item[1], -item[2], -item[0]))
+        return found
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def search_recipes(queryset, query):
+    """Метод фильтрации и ранжирования рецептов по поисковому запросу"""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        ).filter(search_vector=search_query).order_by(
+            '-search_rank', '-pub_date')
+    recipe_ids = recipe_search_index.search(query)
+    if not recipe_ids:
+        return queryset.none()
+    return queryset.filter(pk__in=recipe_ids).order_by(Case(
+        *[When(pk=pk, then=position)
+          for position, pk in enumerate(recipe_ids)],
+        output_field=IntegerField(),
+    ))
@@ -1,10 +1,37 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            Subscription, Tag, TagRecipe)
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            Subscription, Tag, TagRecipe, get_tags_mask)
+from recipes.signals import recipe_ingredients_changed
 from shopping_cart.models import ShoppingCart
+from shopping_cart.shopping_list import change_recipe_in_shopping_lists
 from users.models import User
+from .fields import RecipeImageField
+from .relations import get_user_relations
+from .search import ingredient_index
+
+
+def get_renditions_urls(renditions, request=None):
+    """Ссылки на файлы копий изображения по их путям в хранилище"""
+    urls = {}
+    for name, paths in renditions.items():
+        urls[name] = {}
+        for extension, path in paths.items():
+            url = default_storage.url(path)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[name][extension] = url
+    return urls
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения рецепта"""
+
+    def to_representation(self, value):
+        return get_renditions_urls(value, self.context.get('request'))
 
 
 class UserReadSerializer(serializers.ModelSerializer):
@@ -21,10 +48,11 @@ class UserReadSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Метод определения подписки на автора"""
-        request = self.context.get('request')
-        return (not request.user.is_anonymous and request.user
-                != obj and Subscription.objects.filter(user=request.user,
-                                                       author=obj).exists())
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        relations = get_user_relations(self.context)
+        return relations is not None and relations.contains(
+            'subscriptions', obj.id)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -60,7 +88,7 @@ class RecipeAddSerializer(serializers.ModelSerializer):
     """Сериалайзер для добавления рецептов"""
 
     tags = serializers.ListField()
-    image = Base64ImageField()
+    image = RecipeImageField()
     ingredients = serializers.ListField()
     author = serializers.ReadOnlyField(required=False)
 
@@ -69,22 +97,53 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         fields = ('tags', 'author', 'ingredients', 'name', 'image', 'text',
                   'cooking_time')
 
+    def validate_ingredients(self, value):
+        """Метод проверки ингредиентов без запросов к базе.
+
+        Наличие ингредиентов проверяется по индексу справочника в памяти.
+        """
+        try:
+            ingredients = [{'id': int(ingredient['id']),
+                            'amount': int(ingredient['amount'])}
+                           for ingredient in value]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                'Ингредиент задаётся целыми id и amount.')
+        if any(ingredient['amount'] <= 0 for ingredient in ingredients):
+            raise serializers.ValidationError(
+                'Количество ингредиента должно быть больше 0.')
+        ingredient_ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError(
+                'Ингредиент не должен повторяться.')
+        missing = ingredient_index.get_missing(ingredient_ids)
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}.')
+        return ingredients
+
+    def validate_tags(self, value):
+        """Метод проверки тегов одним запросом"""
+        try:
+            tags = [int(tag) for tag in value]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('Тег задаётся целым id.')
+        tag_ids = set(tags)
+        if len(tag_ids) != len(tags):
+            raise serializers.ValidationError('Тег не должен повторяться.')
+        missing = tag_ids - set(Tag.objects.filter(
+            id__in=tag_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {sorted(missing)}.')
+        return tags
+
     def validate(self, data):
         """Метод проверки данных"""
-        if data['cooking_time'] <= 0:
+        if data.get('cooking_time', 1) <= 0:
             raise serializers.ValidationError(
                 'Время приготовления должно быть больше 0.'
             )
-        ingredients = []
-        for ingredient in data.get('ingredients'):
-            if int(ingredient.get('amount')) <= 0:
-                raise serializers.ValidationError(
-                    'Количество ингредиента должно быть больше 0.')
-            id_ingredient = ingredient.get('id')
-            if id_ingredient in ingredients:
-                raise serializers.ValidationError(
-                    'Ингредиент не должен повторяться.')
-            ingredients.append(id_ingredient)
         return data
 
     def create_tags_ingredients_objects(self, tags, ingredients, recipe):
@@ -101,18 +160,78 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         """Метод создания рецепта"""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        self.create_tags_ingredients_objects(tags, ingredients, recipe)
+        validated_data['tags_mask'] = get_tags_mask(tags)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self.create_tags_ingredients_objects(tags, ingredients, recipe)
+            recipe_ingredients_changed.send(
+                sender=Recipe, recipe_id=recipe.id)
         return recipe
 
+    def update_tags(self, recipe, tags):
+        """Метод изменения тегов рецепта только по разнице с текущими"""
+        current = set(TagRecipe.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        tags = {int(tag) for tag in tags}
+        if current - tags:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=current - tags).delete()
+        TagRecipe.objects.bulk_create([
+            TagRecipe(tag_id=tag, recipe=recipe) for tag in tags - current])
+
+    def update_ingredients(self, recipe, ingredients):
+        """Метод изменения ингредиентов рецепта по разнице с текущими.
+
+        Возвращает старые и новые количества ингредиентов.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(
+                recipe=recipe).only('id', 'ingredient_id', 'amount')
+        }
+        old_amounts = {pk: row.amount for pk, row in current.items()}
+        new_amounts = {int(ingredient['id']): int(ingredient['amount'])
+                       for ingredient in ingredients}
+        removed = [row.id for pk, row in current.items()
+                   if pk not in new_amounts]
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        changed = []
+        for pk, amount in new_amounts.items():
+            if pk in current and current[pk].amount != amount:
+                current[pk].amount = amount
+                changed.append(current[pk])
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(ingredient_id=pk, recipe=recipe, amount=amount)
+            for pk, amount in new_amounts.items() if pk not in current])
+        return old_amounts, new_amounts
+
     def update(self, instance, validated_data):
-        """Метод обновления рецепта"""
-        tags = validated_data.pop('tags', instance.tags)
-        ingredients = validated_data.pop('ingredients', instance.ingredients)
-        instance = super().update(instance, validated_data)
-        TagRecipe.objects.filter(recipe=instance).delete()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        self.create_tags_ingredients_objects(tags, ingredients, instance)
+        """Метод обновления рецепта.
+
+        Меняются только отличающиеся теги и ингредиенты; не переданные
+        в запросе остаются как есть.
+        """
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if validated_data.get('image') == instance.image:
+            validated_data.pop('image')
+        if tags is not None:
+            validated_data['tags_mask'] = get_tags_mask(tags)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if tags is not None:
+                self.update_tags(instance, tags)
+            if ingredients is not None:
+                old_amounts, new_amounts = self.update_ingredients(
+                    instance, ingredients)
+                if old_amounts != new_amounts:
+                    change_recipe_in_shopping_lists(
+                        instance.id, old_amounts, new_amounts)
+                if old_amounts.keys() != new_amounts.keys():
+                    recipe_ingredients_changed.send(
+                        sender=Recipe, recipe_id=instance.id)
         return instance
 
     def to_representation(self, instance):
@@ -130,29 +249,27 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeSerializer(
         source='recipe_from_ingredient', many=True)
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time')
         read_only_fields = ('tags', 'author', 'ingredients')
 
     def get_is_favorited(self, obj):
         """Метод определения рецепта в избранном"""
-        request = self.context.get('request')
-        return (not request.user.is_anonymous
-                and Favorite.objects.filter(user=request.user,
-                                            recipe=obj).exists())
+        relations = get_user_relations(self.context)
+        return relations is not None and relations.contains(
+            'favorites', obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        """Метод определения рецепта в избранном"""
-        request = self.context.get('request')
-        return (not request.user.is_anonymous
-                and ShoppingCart.objects.filter(user=request.user,
-                                                recipe=obj).exists())
+        """Метод определения рецепта в корзине"""
+        relations = get_user_relations(self.context)
+        return relations is not None and relations.contains('cart', obj.id)
 
 
 class ShowFavoriteSerializer(serializers.ModelSerializer):
@@ -180,10 +297,11 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
     """Сериалайзер для короткого вывода рецептов"""
 
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -206,20 +324,25 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Метод определения подписки на автора"""
-        request = self.context.get('request')
-        return (not request.user == obj.author
-                and Subscription.objects.filter(user=request.user,
-                                                author=obj.author).exists())
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        relations = get_user_relations(self.context)
+        return relations is not None and relations.contains(
+            'subscriptions', obj.author_id)
 
     def get_recipes(self, obj):
         """Метод получения рецептов автора"""
-        request = self.context.get('request')
-        if request.GET.get('recipes_limit'):
-            recipe_limit = int(request.GET.get('recipes_limit'))
-            queryset = Recipe.objects.filter(
-                author=obj.author).all()[:recipe_limit]
+        author_recipes = self.context.get('author_recipes')
+        if author_recipes is not None:
+            queryset = author_recipes.get(obj.author_id, [])
         else:
-            queryset = Recipe.objects.filter(author=obj.author).all()
+            request = self.context.get('request')
+            if request.GET.get('recipes_limit'):
+                recipe_limit = int(request.GET.get('recipes_limit'))
+                queryset = Recipe.objects.filter(
+                    author=obj.author).all()[:recipe_limit]
+            else:
+                queryset = Recipe.objects.filter(author=obj.author).all()
         serializer = RecipeSmallSerializer(
             queryset, read_only=True, many=True
         )
@@ -227,4 +350,96 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
 
     def get_recipes_count(self, obj):
         """Метод получения рецептов автора"""
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
+
+
+class RecipeRowsSerializer:
+    """Быстрый сериалайзер списка рецептов только для чтения.
+
+    Работает со строками queryset.values(FIELDS), а теги и ингредиенты
+    всей страницы загружает двумя запросами в словари. Выдаёт ту же
+    схему JSON, что и RecipeSerializer, без создания вложенных
+    сериалайзеров на каждый рецепт.
+    """
+
+    # pub_date и рейтинги нужны курсорной пагинации для позиции страницы.
+    FIELDS = ('id', 'name', 'image', 'image_renditions', 'text',
+              'cooking_time', 'author_id', 'author__email',
+              'author__username', 'author__first_name', 'author__last_name',
+              'pub_date', 'popularity_score', 'trending_score')
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    def get_tags(self, recipe_ids):
+        """Теги рецептов страницы, сгруппированные по id рецепта"""
+        tags = {}
+        for row in TagRecipe.objects.filter(
+                recipe_id__in=recipe_ids).order_by('tag_id').values(
+                    'recipe_id', 'tag_id', 'tag__name', 'tag__color',
+                    'tag__slug'):
+            tags.setdefault(row['recipe_id'], []).append({
+                'id': row['tag_id'],
+                'name': row['tag__name'],
+                'color': row['tag__color'],
+                'slug': row['tag__slug'],
+            })
+        return tags
+
+    def get_ingredients(self, recipe_ids):
+        """Ингредиенты рецептов страницы, сгруппированные по id рецепта"""
+        ingredients = {}
+        for row in IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids).order_by('id').values(
+                    'recipe_id', 'ingredient_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount'):
+            ingredients.setdefault(row['recipe_id'], []).append({
+                'id': row['ingredient_id'],
+                'name': row['ingredient__name'],
+                'measurement_unit': row['ingredient__measurement_unit'],
+                'amount': row['amount'],
+            })
+        return ingredients
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        relations = get_user_relations(self.context)
+        favorites = relations.get('favorites') if relations else frozenset()
+        cart = relations.get('cart') if relations else frozenset()
+        subscriptions = (relations.get('subscriptions') if relations
+                         else frozenset())
+        storage = Recipe._meta.get_field('image').storage
+        recipe_ids = [row['id'] for row in self.rows]
+        tags = self.get_tags(recipe_ids)
+        ingredients = self.get_ingredients(recipe_ids)
+        data = []
+        for row in self.rows:
+            image = None
+            if row['image']:
+                image = storage.url(row['image'])
+                if request is not None:
+                    image = request.build_absolute_uri(image)
+            data.append({
+                'id': row['id'],
+                'tags': tags.get(row['id'], []),
+                'author': {
+                    'email': row['author__email'],
+                    'id': row['author_id'],
+                    'username': row['author__username'],
+                    'first_name': row['author__first_name'],
+                    'last_name': row['author__last_name'],
+                    'is_subscribed': row['author_id'] in subscriptions,
+                },
+                'ingredients': ingredients.get(row['id'], []),
+                'is_favorited': row['id'] in favorites,
+                'is_in_shopping_cart': row['id'] in cart,
+                'name': row['name'],
+                'image': image,
+                'image_renditions': get_renditions_urls(
+                    row['image_renditions'], request),
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            })
+        return data
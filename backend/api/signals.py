@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.images import renditions_saved
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.signals import recipe_ingredients_changed
+from .cache import ingredients_cache, recipe_feed_cache, tags_cache
+from .search import (recipe_ingredient_index, update_search_vector,
+                     update_search_vectors)
+from .versions import bump_version
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сброс кэша тегов после фиксации изменения тега"""
+    transaction.on_commit(tags_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    """Сброс кэша ингредиентов после фиксации изменения ингредиента"""
+    transaction.on_commit(ingredients_cache.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_vectors(instance, created, **kwargs):
+    """Обновление поиска по рецептам после переименования ингредиента"""
+    if created:
+        return
+    ingredient_id = instance.id
+    transaction.on_commit(lambda: update_search_vectors(
+        IngredientRecipe.objects.filter(ingredient_id=ingredient_id)
+        .values_list('recipe_id', flat=True)))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipes(instance, signal, **kwargs):
+    """Смена версии рецептов после фиксации изменения рецепта.
+
+    После сохранения рецепта заодно обновляется его поисковый вектор:
+    к этому моменту записаны и ингредиенты, поэтому вектор актуален
+    для любого способа изменения - API, админки или команды. Удалённый
+    рецепт убирается из индекса подбора по ингредиентам.
+    """
+    recipe_id = instance.id
+
+    def on_commit():
+        if signal is post_save:
+            update_search_vector(recipe_id)
+        else:
+            recipe_ingredient_index.update_recipe(recipe_id)
+        bump_version('recipes')
+
+    transaction.on_commit(on_commit)
+
+
+@receiver(recipe_ingredients_changed)
+def update_recipe_ingredient_index(recipe_id, **kwargs):
+    """Точечное обновление индекса подбора после фиксации изменения
+       ингредиентов рецепта
+    """
+    transaction.on_commit(
+        lambda: recipe_ingredient_index.update_recipe(recipe_id))
+
+
+@receiver(renditions_saved)
+def invalidate_recipe_feed(**kwargs):
+    """Сброс кэша ленты после сохранения копий изображения рецепта"""
+    recipe_feed_cache.invalidate()
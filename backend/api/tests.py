@@ -0,0 +1,159 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Subscription, Tag, TagRecipe)
+from shopping_cart.models import ShoppingCart
+from users.models import User
+from .querysets import get_recipe_feed
+from .serializers import RecipeRowsSerializer, RecipeSerializer
+
+RENDITIONS = {
+    'thumbnail': {'webp': 'recipes/renditions/abc_thumbnail.webp',
+                  'jpeg': 'recipes/renditions/abc_thumbnail.jpeg'},
+}
+
+
+class RecipeRowsSerializerTest(TestCase):
+    """Сверка RecipeRowsSerializer с RecipeSerializer.
+
+    Ответы сравниваются без сортировки: порядок тегов и ингредиентов
+    у обоих сериалайзеров должен совпадать.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='Автор',
+                last_name=str(number), password='password-1234')
+            for number in range(2)
+        ]
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Читатель',
+            password='password-1234')
+        tags = [Tag.objects.create(name=f'Тег {number}', color='#000000',
+                                   slug=f'tag-{number}')
+                for number in range(3)]
+        ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(4)]
+        now = timezone.now()
+        cls.recipes = []
+        for number in range(5):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 2], name=f'Рецепт {number}',
+                text='Описание', cooking_time=number + 1,
+                image='' if number == 1 else f'recipes/images/{number}.png')
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(hours=number))
+            for tag in reversed(tags[number % 2:]):
+                TagRecipe.objects.create(recipe=recipe, tag=tag)
+            for ingredient in reversed(ingredients[:number % 3 + 2]):
+                IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1)
+            cls.recipes.append(recipe)
+        Recipe.objects.filter(pk=cls.recipes[2].pk).update(
+            image_renditions=RENDITIONS)
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[3])
+        Subscription.objects.create(user=cls.reader, author=cls.authors[1])
+        cls.recipe_ids = [recipe.id for recipe in cls.recipes]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_context(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return {'request': request}
+
+    def render(self, data):
+        return json.loads(JSONRenderer().render(data))
+
+    def get_expected(self, user, recipe_ids):
+        """Ответ RecipeSerializer для рецептов recipe_ids в их порядке"""
+        recipes = get_recipe_feed().in_bulk(recipe_ids)
+        return self.render(RecipeSerializer(
+            [recipes[pk] for pk in recipe_ids], many=True,
+            context=self.get_context(user)).data)
+
+    def get_cursor_results(self, url):
+        """Результаты всех страниц курсорной пагинации"""
+        results = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            results.extend(response.json()['results'])
+            url = response.json()['next']
+        return results
+
+    def test_serializers_match(self):
+        """Сериалайзеры отдают одинаковые данные для одной страницы"""
+        queryset = get_recipe_feed().order_by('-pub_date', '-id')
+        for user in (AnonymousUser(), self.reader):
+            with self.subTest(user=user):
+                rows = RecipeRowsSerializer(
+                    list(queryset.prefetch_related(None).values(
+                        *RecipeRowsSerializer.FIELDS)),
+                    context=self.get_context(user)).data
+                self.assertEqual(self.render(rows), self.get_expected(
+                    user, self.recipe_ids))
+
+    def test_flags_and_images(self):
+        """Признаки, пустое изображение и копии изображения в ответе"""
+        self.client.force_authenticate(self.reader)
+        results = self.client.get('/api/recipes/?limit=5').json()['results']
+        self.assertEqual(results, self.get_expected(
+            self.reader, self.recipe_ids))
+        self.assertTrue(results[0]['is_favorited'])
+        self.assertTrue(results[3]['is_in_shopping_cart'])
+        self.assertTrue(results[1]['author']['is_subscribed'])
+        self.assertIsNone(results[1]['image'])
+        self.assertEqual(
+            results[2]['image_renditions']['thumbnail']['webp'],
+            f"http://testserver/media/{RENDITIONS['thumbnail']['webp']}")
+
+    def test_page_pagination(self):
+        """Страница с номером совпадает для анонима и пользователя"""
+        for user in (AnonymousUser(), self.reader):
+            with self.subTest(user=user):
+                self.client.force_authenticate(
+                    None if user.is_anonymous else user)
+                response = self.client.get('/api/recipes/?page=2&limit=2')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['count'], 5)
+                self.assertEqual(response.json()['results'], self.get_expected(
+                    user, self.recipe_ids[2:4]))
+
+    def test_cursor_pagination(self):
+        """Курсорная пагинация проходит все рецепты в том же порядке"""
+        for user in (AnonymousUser(), self.reader):
+            with self.subTest(user=user):
+                self.client.force_authenticate(
+                    None if user.is_anonymous else user)
+                results = self.get_cursor_results(
+                    '/api/recipes/?pagination=cursor&limit=2')
+                self.assertEqual(results, self.get_expected(
+                    user, self.recipe_ids))
+
+    def test_search_ignores_cursor_pagination(self):
+        """Поиск с ?pagination=cursor остаётся постраничным"""
+        params = {'search': 'Рецепт', 'limit': 2}
+        response = self.client.get(
+            '/api/recipes/', {**params, 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 5)
+        self.assertEqual(response.json()['results'], self.client.get(
+            '/api/recipes/', params).json()['results'])
@@ -1,8 +1,9 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import (FavoriteAPIView, IngredientViewSet, RecipeViewSet,
-                    ShoppingCartAPIView, SubscribeAPIView,
+from .views import (FavoriteAPIView, FavoriteBatchAPIView, IngredientViewSet,
+                    RecipeViewSet, ShoppingCartAPIView,
+                    ShoppingCartBatchAPIView, SubscribeAPIView,
                     SubscriptionsListAPIView, TagViewSet)
 
 app_name = 'api'
@@ -24,5 +25,9 @@ urlpatterns = [
     path('recipes/<int:recipe_id>/shopping_cart/',
          ShoppingCartAPIView.as_view(),
          name='shopping_cart'),
+    path('recipes/favorite/', FavoriteBatchAPIView.as_view(),
+         name='favorite_batch'),
+    path('recipes/shopping_cart/', ShoppingCartBatchAPIView.as_view(),
+         name='shopping_cart_batch'),
     path('', include(router_v1.urls)),
 ]
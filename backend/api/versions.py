@@ -0,0 +1,47 @@
+"""Версии наборов данных для сброса кэшей и индексов в памяти."""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{}'
+
+
+def get_version(name):
+    """Текущая версия набора данных name"""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*names):
+    """Текущие версии наборов данных names одним обращением к кэшу"""
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        return tuple(versions.get(key) or get_version(name)
+                     for key, name in zip(keys, names))
+    return tuple(versions[key] for key in keys)
+
+
+def incr_version(name):
+    """Увеличение версии набора данных name на единицу.
+
+    В отличие от bump_version, по результату видно, была ли смена
+    версии единственной с момента old: тогда она равна old + 1.
+    """
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+        return cache.incr(key)
+
+
+def bump_version(name):
+    """Смена версии набора данных name, делающая устаревшими его кэши"""
+    version = time.time_ns()
+    cache.set(VERSION_KEY.format(name), version, None)
+    return version
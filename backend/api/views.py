@@ -1,23 +1,44 @@
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import BooleanField, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.pagination import CustomPagination
+from api.pagination import (CustomPagination, RecipePagination,
+                            SubscriptionPagination)
+from api.querysets import get_author_recipes, get_recipe_feed
+from recipes.counters import change_counter, change_counters
 from recipes.models import Favorite, Ingredient, Recipe, Subscription, Tag
-from shopping_cart.download_cart import download_ingredients
+from recipes.recommendations import RECOMMENDED_LIMIT
+from shopping_cart.download_cart import (download_ingredients,
+                                         get_cart_ingredients)
 from shopping_cart.models import ShoppingCart
+from shopping_cart.shopping_list import (add_recipe_to_shopping_list,
+                                         add_recipes_to_shopping_list,
+                                         remove_recipe_from_shopping_list,
+                                         remove_recipes_from_shopping_list)
 from users.models import User
+from .cache import ingredients_cache, recipe_feed_cache, tags_cache
 from .filters import IngredientFilter, RecipeFilter
+from .mixins import CachedReferenceMixin
+from .parsers import LimitedJSONParser
 from .permissions import OwnerOrReadPermission
+from .relations import invalidate_user_relations
+from .renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                        PDFShoppingListRenderer, TextShoppingListRenderer)
+from .search import ingredient_index, recipe_ingredient_index
 from .serializers import (IngredientSerializer, RecipeAddSerializer,
-                          RecipeSerializer, RecipeSmallSerializer,
-                          SubscriptionsSerializer, TagSerializer)
+                          RecipeRowsSerializer, RecipeSerializer,
+                          RecipeSmallSerializer, SubscriptionsSerializer,
+                          TagSerializer)
 
 
 class FavoriteAPIView(APIView):
@@ -28,27 +49,29 @@ class FavoriteAPIView(APIView):
     def post(self, request, recipe_id):
         """Метод для добавления в избранное."""
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        if Favorite.objects.filter(
-                user=request.user, recipe=recipe).exists():
-            return Response(
-                {'error': 'Вы уже добавили этот рецепт в избранное'},
-                status=status.HTTP_400_BAD_REQUEST)
-        favorite_recipe = Favorite.objects.create(
-            user=request.user, recipe=recipe)
-        serializer = RecipeSmallSerializer(favorite_recipe.recipe)
+        with transaction.atomic():
+            if not Favorite.relations.add(request.user.id, recipe.id):
+                return Response(
+                    {'error': 'Вы уже добавили этот рецепт в избранное'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            change_counter(Recipe, recipe.id, 'favorites_count')
+            invalidate_user_relations(request.user.id, 'favorites')
+            transaction.on_commit(recipe_feed_cache.invalidate)
+        serializer = RecipeSmallSerializer(recipe)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, recipe_id):
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        favorite_recipe = Favorite.objects.filter(
-            user=request.user, recipe=recipe)
-        if favorite_recipe.exists():
-            favorite_recipe.delete()
-            return Response({'message': 'Рецепт успешно удален из избранного'},
-                            status=status.HTTP_204_NO_CONTENT)
-        return Response({'message': 'Рецепта не было в избранном'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted = Favorite.relations.remove(request.user.id, recipe_id)
+            if not deleted:
+                return Response({'message': 'Рецепта не было в избранном'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            change_counter(Recipe, recipe_id, 'favorites_count', -deleted)
+            invalidate_user_relations(request.user.id, 'favorites')
+            transaction.on_commit(recipe_feed_cache.invalidate)
+        return Response({'message': 'Рецепт успешно удален из избранного'},
+                        status=status.HTTP_204_NO_CONTENT)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -56,7 +79,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     queryset = Recipe.objects.all()
     permission_classes = (OwnerOrReadPermission,)
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
+    parser_classes = (LimitedJSONParser, FormParser, MultiPartParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
@@ -66,40 +90,172 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeAddSerializer
         return RecipeSerializer
 
+    def get_queryset(self):
+        """Рецепты с подгруженными связями"""
+        return get_recipe_feed()
+
+    def list_rows(self, request):
+        """Список рецептов через RecipeRowsSerializer"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.prefetch_related(None).values(
+            *RecipeRowsSerializer.FIELDS))
+        return self.get_paginated_response(RecipeRowsSerializer(
+            page, context=self.get_serializer_context()).data)
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов; анонимам страницы отдаются из кэша"""
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return self.list_rows(request)
+        return recipe_feed_cache.get_response(
+            request, lambda: self.list_rows(request))
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAdminUser,))
+    def feed_cache_stats(self, request):
+        """Метод получения статистики кэша ленты рецептов"""
+        return Response(recipe_feed_cache.get_stats())
+
     def perform_create(self, serializer):
         """Переопределение метода создания поста"""
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            serializer.save(author=self.request.user)
+            change_counter(User, self.request.user.id, 'recipes_count')
+
+    def perform_destroy(self, instance):
+        """Переопределение метода удаления поста"""
+        with transaction.atomic():
+            instance.delete()
+            change_counter(User, instance.author_id, 'recipes_count', -1)
 
     @action(detail=False, methods=('get',),
             url_name='download_shopping_cart',
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              JSONShoppingListRenderer,
+                              PDFShoppingListRenderer))
     def download_shopping_cart(self, request):
         """Метод для скачивания списка покупок"""
-        ingredients = download_ingredients(request.user)
-        return HttpResponse(
+        file_format = request.accepted_renderer.format
+        content_type, ingredients = download_ingredients(
+            request.user, file_format)
+        response = StreamingHttpResponse(
             ingredients,
-            content_type='text/plain,charset=utf8',
+            content_type=content_type,
             status=status.HTTP_200_OK,
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_format}"')
+        return response
+
+    @action(detail=False, methods=('get',))
+    def match(self, request):
+        """Метод подбора рецептов по имеющимся ингредиентам.
+
+        Рецепты упорядочены по доле своих ингредиентов, найденных среди
+        переданных в ?ingredients=1,2,3.
+        """
+        try:
+            ingredient_ids = {
+                int(ingredient_id)
+                for value in request.query_params.getlist('ingredients')
+                for ingredient_id in value.split(',') if ingredient_id
+            }
+            min_coverage = float(
+                request.query_params.get('min_coverage', 0))
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Ожидаются id ингредиентов через запятую.'})
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Нужно указать хотя бы один ингредиент.'})
+        paginator = CustomPagination()
+        page = paginator.paginate_queryset(
+            recipe_ingredient_index.match(ingredient_ids, min_coverage),
+            request, self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        data = []
+        for recipe_id, coverage, matched in page:
+            if recipe_id not in recipes:
+                continue
+            item = self.get_serializer(recipes[recipe_id]).data
+            item['coverage'] = round(coverage, 3)
+            item['matched_ingredients'] = matched
+            data.append(item)
+        return paginator.get_paginated_response(data)
+
+    def get_recipes_response(self, recipe_ids):
+        """Ответ со списком рецептов в порядке recipe_ids"""
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return Response(self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True).data)
+
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk=None):
+        """Метод получения рецептов, похожих на данный"""
+        recipe = get_object_or_404(
+            Recipe.objects.only('similar_recipes'), pk=pk)
+        return self.get_recipes_response(recipe.similar_recipes)
 
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,))
+    def recommended(self, request):
+        """Метод получения рекомендаций для пользователя.
+
+        Пока рекомендации не рассчитаны, отдаются популярные рецепты
+        других авторов.
+        """
+        if request.user.recommended_recipes:
+            return self.get_recipes_response(
+                request.user.recommended_recipes)
+        recipes = self.get_queryset().exclude(author=request.user).order_by(
+            '-popularity_score', '-pub_date')[:RECOMMENDED_LIMIT]
+        return Response(self.get_serializer(recipes, many=True).data)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,))
+    def shopping_list(self, request):
+        """Метод получения списка покупок в JSON"""
+        return Response([{
+            'id': ingredient['ingredient_id'],
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['total_amount'],
+        } for ingredient in get_cart_ingredients(request.user)])
+
+
+class TagViewSet(CachedReferenceMixin, viewsets.ReadOnlyModelViewSet):
     """Вью сет для тегов"""
 
+    reference_cache = tags_cache
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedReferenceMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вью сет для ингредиентов"""
 
+    reference_cache = ingredients_cache
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """Автодополнение по названию из индекса в памяти"""
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        contains = request.query_params.get('contains') in ('1', 'true')
+        return Response(ingredient_index.search(name, contains=contains))
+
 
 class ShoppingCartAPIView(APIView):
     """Вью сет для списка покупок"""
@@ -109,26 +265,129 @@ class ShoppingCartAPIView(APIView):
     def post(self, request, recipe_id):
         """Метод для добавления в избранное"""
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        if ShoppingCart.objects.filter(
-                user=request.user, recipe=recipe).exists():
-            return Response(
-                {'error': 'Вы уже добавили этот рецепт в корзину'},
-                status=status.HTTP_400_BAD_REQUEST)
-        recipe_in_cart = ShoppingCart.objects.create(
-            user=request.user, recipe=recipe)
-        serializer = RecipeSmallSerializer(recipe_in_cart.recipe)
+        with transaction.atomic():
+            if not ShoppingCart.relations.add(request.user.id, recipe.id):
+                return Response(
+                    {'error': 'Вы уже добавили этот рецепт в корзину'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            add_recipe_to_shopping_list(request.user.id, recipe.id)
+            change_counter(Recipe, recipe.id, 'carts_count')
+            invalidate_user_relations(request.user.id, 'cart')
+        serializer = RecipeSmallSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, recipe_id):
         """Метод удаления рецепта из списка покупок"""
-        recipe_in_cart = ShoppingCart.objects.filter(
-            user=request.user, recipe=recipe_id)
-        if recipe_in_cart.exists():
-            recipe_in_cart.delete()
-            return Response({'message': 'Рецепт успешно удален из корзины'},
-                            status=status.HTTP_204_NO_CONTENT)
-        return Response({'message': 'Рецепта не было в корзине'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted = ShoppingCart.relations.remove(request.user.id, recipe_id)
+            if not deleted:
+                return Response({'message': 'Рецепта не было в корзине'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            remove_recipe_from_shopping_list(
+                request.user.id, recipe_id, deleted)
+            change_counter(Recipe, recipe_id, 'carts_count', -deleted)
+            invalidate_user_relations(request.user.id, 'cart')
+        return Response({'message': 'Рецепт успешно удален из корзины'},
+                        status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchRecipeRelationAPIView(APIView):
+    """Базовый вью класс пакетного добавления и удаления рецептов.
+
+    Принимает {"recipes": [id, ...]} и выполняет один INSERT или DELETE
+    в одной транзакции, возвращая результат по каждому рецепту.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    model = None
+    counter_field = None
+    relation_kind = None
+    max_recipes = 100
+
+    def get_recipe_ids(self, request):
+        """Список id рецептов из тела запроса без повторов"""
+        recipe_ids = request.data.get('recipes')
+        if (not isinstance(recipe_ids, list) or not recipe_ids
+                or len(recipe_ids) > self.max_recipes):
+            raise ValidationError({'recipes': (
+                f'Ожидается список от 1 до {self.max_recipes} id рецептов.')})
+        try:
+            return list(dict.fromkeys(int(pk) for pk in recipe_ids))
+        except (TypeError, ValueError):
+            raise ValidationError(
+                {'recipes': 'Id рецептов должны быть целыми числами.'})
+
+    def after_add(self, user_id, recipe_ids):
+        """Метод обновления зависимых данных после добавления"""
+
+    def after_remove(self, user_id, recipe_ids):
+        """Метод обновления зависимых данных после удаления"""
+
+    def get_response(self, recipe_ids, statuses):
+        return Response({'results': [
+            {'id': pk, 'status': statuses(pk)} for pk in recipe_ids]})
+
+    def post(self, request):
+        """Метод пакетного добавления рецептов.
+
+        Найденные рецепты блокируются до конца транзакции, чтобы их не
+        удалили между проверкой и вставкой связей.
+        """
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            found = set(Recipe.objects.filter(pk__in=recipe_ids).order_by(
+                'id').select_for_update(no_key=True).values_list(
+                'id', flat=True))
+            added = self.model.relations.add_many(request.user.id, [
+                pk for pk in recipe_ids if pk in found])
+            change_counters(Recipe, added, self.counter_field)
+            if added:
+                invalidate_user_relations(request.user.id, self.relation_kind)
+                self.after_add(request.user.id, added)
+        return self.get_response(recipe_ids, lambda pk: (
+            'added' if pk in added
+            else 'exists' if pk in found else 'not_found'))
+
+    def delete(self, request):
+        """Метод пакетного удаления рецептов"""
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            removed = self.model.relations.remove_many(
+                request.user.id, recipe_ids)
+            change_counters(Recipe, removed, self.counter_field, -1)
+            if removed:
+                invalidate_user_relations(request.user.id, self.relation_kind)
+                self.after_remove(request.user.id, removed)
+        return self.get_response(recipe_ids, lambda pk: (
+            'removed' if pk in removed else 'missing'))
+
+
+class FavoriteBatchAPIView(BatchRecipeRelationAPIView):
+    """Вью класс пакетного изменения избранного"""
+
+    model = Favorite
+    counter_field = 'favorites_count'
+    relation_kind = 'favorites'
+
+    def after_add(self, user_id, recipe_ids):
+        transaction.on_commit(recipe_feed_cache.invalidate)
+
+    def after_remove(self, user_id, recipe_ids):
+        transaction.on_commit(recipe_feed_cache.invalidate)
+
+
+class ShoppingCartBatchAPIView(BatchRecipeRelationAPIView):
+    """Вью класс пакетного изменения корзины"""
+
+    model = ShoppingCart
+    counter_field = 'carts_count'
+    relation_kind = 'cart'
+
+    def after_add(self, user_id, recipe_ids):
+        add_recipes_to_shopping_list(user_id, recipe_ids)
+
+    def after_remove(self, user_id, recipe_ids):
+        remove_recipes_from_shopping_list(user_id, recipe_ids)
 
 
 class SubscribeAPIView(APIView):
@@ -139,28 +398,34 @@ class SubscribeAPIView(APIView):
     def post(self, request, user_id):
         """Метод для создания экземпляра подписки"""
         author = get_object_or_404(User, id=user_id)
-        if self.request.user == author or Subscription.objects.filter(
-                user=request.user, author=user_id).exists():
-            return Response(
-                {'error': 'Вы пытаетесь подписаться на самого '
-                 'себя или уже подписаны на этого автора'},
-                status=status.HTTP_400_BAD_REQUEST)
-        subscription = Subscription.objects.create(
-            author=author, user=self.request.user)
+        error = Response(
+            {'error': 'Вы пытаетесь подписаться на самого '
+             'себя или уже подписаны на этого автора'},
+            status=status.HTTP_400_BAD_REQUEST)
+        if self.request.user == author:
+            return error
+        with transaction.atomic():
+            if not Subscription.relations.add(request.user.id, author.id):
+                return error
+            change_counter(User, author.id, 'subscribers_count')
+            invalidate_user_relations(request.user.id, 'subscriptions')
+        subscription = Subscription(user=request.user, author=author)
+        subscription.is_subscribed = True
         serializer = SubscriptionsSerializer(
             subscription, context={'request': request})
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, user_id):
-        subscription = Subscription.objects.filter(
-            user=request.user, author=user_id)
-        if subscription.exists():
-            subscription.delete()
-            return Response({'message': 'Подписка успешно удалена'},
-                            status=status.HTTP_204_NO_CONTENT)
-        return Response({'message': 'У вас не было такой подписки'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted = Subscription.relations.remove(request.user.id, user_id)
+            if not deleted:
+                return Response({'message': 'У вас не было такой подписки'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            change_counter(User, user_id, 'subscribers_count', -deleted)
+            invalidate_user_relations(request.user.id, 'subscriptions')
+        return Response({'message': 'Подписка успешно удалена'},
+                        status=status.HTTP_204_NO_CONTENT)
 
 
 class SubscriptionsListAPIView(ListAPIView):
@@ -168,7 +433,33 @@ class SubscriptionsListAPIView(ListAPIView):
 
     serializer_class = SubscriptionsSerializer
     permission_classes = (IsAuthenticated,)
-    pagination_class = CustomPagination
+    pagination_class = SubscriptionPagination
 
     def get_queryset(self):
-        return self.request.user.subscriber.all()
+        return self.request.user.subscriber.select_related(
+            'author').annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+
+    def get_recipes_limit(self):
+        """Ограничение числа рецептов автора из параметра recipes_limit"""
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            return max(int(recipes_limit), 0)
+        except ValueError:
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым числом.'})
+
+    def list(self, request, *args, **kwargs):
+        """Список подписок с рецептами авторов за постоянное число запросов"""
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        context['author_recipes'] = get_author_recipes(
+            [subscription.author_id for subscription in page],
+            self.get_recipes_limit(),
+        )
+        serializer = self.get_serializer(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
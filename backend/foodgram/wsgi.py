@@ -1,7 +1,15 @@
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+from api.search import ingredient_index  # noqa: E402
+
+try:
+    ingredient_index.load()
+except DatabaseError:
+    pass
@@ -1,7 +1,16 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     Subscription, Tag, TagRecipe)
+                     Subscription, Tag, TagRecipe, get_tags_mask)
+from .signals import recipe_ingredients_changed
+
+
+def refresh_tags_masks(recipe_ids):
+    """Метод пересчёта битовых масок тегов рецептов по TagRecipe"""
+    for recipe_id in set(recipe_ids):
+        Recipe.objects.filter(pk=recipe_id).update(tags_mask=get_tags_mask(
+            TagRecipe.objects.filter(recipe_id=recipe_id).values_list(
+                'tag_id', flat=True)))
 
 
 class IngredientRecipeAdminInLine(admin.TabularInline):
@@ -17,7 +26,8 @@ class TagRecipeAdminInLine(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     """Настройки админ панели для модели Рецептов"""
 
-    list_display = ('id', 'name', 'author', 'cooking_time', 'pub_date')
+    list_display = ('id', 'name', 'author', 'cooking_time', 'pub_date',
+                    'favorites_count', 'carts_count')
     search_fields = ('name',)
     list_filter = ('tags', 'name', 'author')
     inlines = (IngredientRecipeAdminInLine, TagRecipeAdminInLine)
@@ -30,19 +40,18 @@ class RecipeAdmin(admin.ModelAdmin):
             'fields': ('text', 'cooking_time')
         }),
         ('Счётчики', {
-            'fields': ('in_favorite_count', 'in_cart_count')
+            'fields': ('favorites_count', 'carts_count')
         })
     )
-    readonly_fields = ('in_favorite_count', 'in_cart_count', 'pub_date')
-
-    def in_favorite_count(self, obj):
-        return obj.recipe_in_favorite.count()
+    readonly_fields = ('favorites_count', 'carts_count', 'pub_date')
 
-    def in_cart_count(self, obj):
-        return obj.recipe_cart.count()
-
-    in_favorite_count.short_description = 'Пользователей,добавили в избранное:'
-    in_cart_count.short_description = 'Пользователей, добавили в корзину:'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recipe = form.instance
+        refresh_tags_masks([recipe.pk])
+        if any(formset.model is IngredientRecipe and formset.has_changed()
+               for formset in formsets):
+            recipe_ingredients_changed.send(sender=Recipe, recipe_id=recipe.pk)
 
 
 class IngredientsAdmin(admin.ModelAdmin):
@@ -52,6 +61,30 @@ class IngredientsAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+class TagRecipeAdmin(admin.ModelAdmin):
+    """Настройки админ панели для модели Теги-Рецепт.
+
+    После изменения связи пересчитывается маска тегов рецепта, как
+    при сохранении рецепта с тегами.
+    """
+
+    list_display = ('id', 'recipe', 'tag')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_tags_masks(
+            [obj.recipe_id, form.initial.get('recipe', obj.recipe_id)])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_tags_masks([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_tags_masks(recipe_ids)
+
+
 class IngredientRecipeAdmin(admin.ModelAdmin):
     """Настройки админ панели для модели Ингредиенты-Рецепт"""
 
@@ -63,6 +96,6 @@ admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientsAdmin)
 admin.site.register(IngredientRecipe, IngredientRecipeAdmin)
 admin.site.register(Tag)
-admin.site.register(TagRecipe)
+admin.site.register(TagRecipe, TagRecipeAdmin)
 admin.site.register(Subscription)
 admin.site.register(Favorite)
@@ -0,0 +1,91 @@
+"""Денормализованные счётчики рецептов и пользователей."""
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Recipe, TagRecipe, get_tags_mask
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'carts_count', 'shopping_cart.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'subscribers_count', 'recipes.Subscription', 'author'),
+)
+
+
+def get_changed_value(field, delta):
+    """Выражение нового значения счётчика, не опускающееся ниже нуля.
+
+    Связь могла быть создана в обход счётчика (например, в админке),
+    тогда её удаление не должно нарушать ограничение поля.
+    """
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def change_counter(model, pk, field, delta=1):
+    """Метод атомарного изменения счётчика field у записи pk"""
+    if delta:
+        model.objects.filter(pk=pk).update(
+            **{field: get_changed_value(field, delta)})
+
+
+def change_counters(model, pks, field, delta=1):
+    """Метод изменения счётчика field у нескольких записей одним UPDATE"""
+    if delta and pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: get_changed_value(field, delta)})
+
+
+def get_actual_count(related_model, related_field):
+    """Подзапрос с фактическим числом связанных записей"""
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')},
+        ).order_by().values(related_field).annotate(
+            total=Count('pk'),
+        ).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def recount_counters(dry_run=False):
+    """Метод сверки счётчиков с фактическими данными.
+
+    Возвращает число расхождений по каждому счётчику; без dry_run
+    расхождения исправляются одним UPDATE на счётчик.
+    """
+    drift = {}
+    with transaction.atomic():
+        for model_name, field, related_name, related_field in COUNTERS:
+            model = apps.get_model(model_name)
+            actual = get_actual_count(
+                apps.get_model(related_name), related_field)
+            stale = model.objects.annotate(actual=actual).exclude(
+                **{field: F('actual')})
+            drift[f'{model_name}.{field}'] = stale.count()
+            if not dry_run:
+                model.objects.filter(pk__in=stale.values('pk')).update(
+                    **{field: actual})
+    return drift
+
+
+def recount_tags_masks(dry_run=False):
+    """Метод сверки битовых масок тегов рецептов с TagRecipe"""
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in TagRecipe.objects.values_list(
+            'recipe_id', 'tag_id').iterator():
+        tag_ids[recipe_id].append(tag_id)
+    stale = [
+        Recipe(id=pk, tags_mask=get_tags_mask(tag_ids[pk]))
+        for pk, mask in Recipe.objects.values_list(
+            'id', 'tags_mask').iterator()
+        if mask != get_tags_mask(tag_ids[pk])
+    ]
+    if not dry_run:
+        Recipe.objects.bulk_update(stale, ('tags_mask',), batch_size=1000)
+    return len(stale)
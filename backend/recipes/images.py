@@ -0,0 +1,84 @@
+"""Уменьшенные копии изображений рецептов."""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .storage import touch
+
+RENDITIONS_DIR = 'recipes/renditions/'
+RENDITION_FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+RENDITION_QUALITY = 80
+
+# Отправляется с recipe_id после сохранения копий изображения рецепта.
+renditions_saved = Signal()
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-image',
+)
+
+
+def build_renditions(content):
+    """Метод создания копий изображения для всех размеров и форматов.
+
+    Имена файлов строятся из хэша содержимого, поэтому файлы не меняются
+    и уже созданные копии повторно не кодируются.
+    """
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    renditions = {}
+    with Image.open(BytesIO(content)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    for name, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+        rendition = None
+        renditions[name] = {}
+        for extension, image_format in RENDITION_FORMATS:
+            path = f'{RENDITIONS_DIR}{digest}_{name}.{extension}'
+            if default_storage.exists(path):
+                touch(default_storage, path)
+            else:
+                if rendition is None:
+                    rendition = image.copy()
+                    rendition.thumbnail(size, Image.LANCZOS)
+                buffer = BytesIO()
+                rendition.save(buffer, image_format,
+                               quality=RENDITION_QUALITY)
+                path = default_storage.save(
+                    path, ContentFile(buffer.getvalue()))
+            renditions[name][extension] = path
+    return renditions
+
+
+def generate_renditions(recipe_id, image_name):
+    """Метод сохранения копий изображения рецепта"""
+    with default_storage.open(image_name) as image_file:
+        renditions = build_renditions(image_file.read())
+    if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            image_renditions=renditions):
+        renditions_saved.send(sender=Recipe, recipe_id=recipe_id)
+
+
+def generate_renditions_in_worker(recipe_id, image_name):
+    """Задача пула: создание копий в отдельном потоке"""
+    try:
+        generate_renditions(recipe_id, image_name)
+    except Exception:
+        logging.exception(
+            f'Не удалось создать копии изображения рецепта {recipe_id}')
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """Метод постановки создания копий в пул после фиксации транзакции"""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(lambda: executor.submit(
+        generate_renditions_in_worker, recipe_id, image_name))
@@ -0,0 +1,27 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для создания копий изображений уже загруженных рецептов"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать копии у всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions={})
+        count = 0
+        for recipe_id, image_name in recipes.values_list(
+                'id', 'image').iterator():
+            generate_renditions(recipe_id, image_name)
+            count += 1
+        logging.info(f'Обработано рецептов: {count}')
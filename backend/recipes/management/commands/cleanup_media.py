@@ -0,0 +1,48 @@
+import logging
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.images import RENDITIONS_DIR
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+IMAGES_DIR = 'recipes/images/'
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для удаления файлов, на которые не ссылается ни один рецепт"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать файлы для удаления')
+        parser.add_argument('--min-age', type=int, default=24,
+                            help='Не трогать файлы моложе стольких часов')
+
+    def handle(self, *args, **options):
+        referenced = set()
+        for image, renditions in Recipe.objects.values_list(
+                'image', 'image_renditions').iterator():
+            referenced.add(image)
+            for paths in renditions.values():
+                referenced.update(paths.values())
+        deadline = timezone.now() - timedelta(hours=options['min_age'])
+        removed = 0
+        for storage, directory in ((recipe_image_storage, IMAGES_DIR),
+                                   (default_storage, RENDITIONS_DIR)):
+            if not storage.exists(directory):
+                continue
+            for file_name in storage.listdir(directory)[1]:
+                name = posixpath.join(directory, file_name)
+                if (name in referenced
+                        or storage.get_modified_time(name) > deadline):
+                    continue
+                removed += 1
+                if not options['dry_run']:
+                    storage.delete(name)
+        logging.info(f'Файлов без ссылок: {removed}')
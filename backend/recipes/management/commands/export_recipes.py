@@ -0,0 +1,82 @@
+import base64
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+
+from recipes.models import IngredientRecipe, Recipe, TagRecipe
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для выгрузки рецептов в JSON Lines, по рецепту на строку"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--embed-images', action='store_true',
+                            help='Включить изображения в base64')
+
+    def get_batches(self, batch_size):
+        """Рецепты пачками по возрастанию id со связями пачки"""
+        last_id = 0
+        while True:
+            recipes = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+                'pk').values('id', 'author__email', 'name', 'text', 'image',
+                             'cooking_time', 'pub_date')[:batch_size])
+            if not recipes:
+                return
+            recipe_ids = [recipe['id'] for recipe in recipes]
+            tags = defaultdict(list)
+            for recipe_id, slug in TagRecipe.objects.filter(
+                    recipe_id__in=recipe_ids).values_list(
+                        'recipe_id', 'tag__slug'):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, unit, amount in (
+                    IngredientRecipe.objects.filter(
+                        recipe_id__in=recipe_ids).values_list(
+                            'recipe_id', 'ingredient__name',
+                            'ingredient__measurement_unit', 'amount')):
+                ingredients[recipe_id].append({
+                    'name': name, 'measurement_unit': unit, 'amount': amount})
+            yield recipes, tags, ingredients
+            last_id = recipe_ids[-1]
+
+    def get_lines(self, batch_size, embed_images):
+        """Строки JSON Lines для всех рецептов"""
+        storage = Recipe._meta.get_field('image').storage
+        for recipes, tags, ingredients in self.get_batches(batch_size):
+            for recipe in recipes:
+                recipe_id = recipe.pop('id')
+                recipe['author'] = recipe.pop('author__email')
+                recipe['pub_date'] = recipe['pub_date'].isoformat()
+                recipe['tags'] = tags[recipe_id]
+                recipe['ingredients'] = ingredients[recipe_id]
+                if embed_images and recipe['image']:
+                    with storage.open(recipe['image']) as image:
+                        recipe['image_data'] = base64.b64encode(
+                            image.read()).decode()
+                yield json.dumps(recipe, ensure_ascii=False) + '\n'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        output = (sys.stdout if options['path'] == '-'
+                  else open(options['path'], 'w', encoding='utf-8'))
+        count = 0
+        try:
+            for line in self.get_lines(
+                    options['batch_size'], options['embed_images']):
+                output.write(line)
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.monotonic() - started
+        logging.info(f'Выгружено рецептов: {count} за {elapsed:.1f} с '
+                     f'({count / max(elapsed, 1e-6):.0f} в секунду)')
@@ -0,0 +1,180 @@
+import base64
+import json
+import logging
+import posixpath
+import sys
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from api.cache import ingredients_cache
+from api.search import recipe_ingredient_index, update_search_vectors
+from api.versions import bump_version
+from recipes.counters import change_counter
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe, get_tags_mask)
+from users.models import User
+
+IMAGES_DIR = 'recipes/images/'
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для загрузки рецептов из JSON Lines.
+
+    Рецепты сопоставляются по автору и названию: уже существующие
+    пропускаются, поэтому команду можно запускать повторно. Ингредиенты
+    ищутся по названию и единице измерения, недостающие создаются.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл для загрузки, по умолчанию stdin')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read_records(self, lines):
+        """Разбор строк JSON Lines с номером строки для ошибок"""
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Строка {number}: {error}')
+
+    def get_ingredient_ids(self, records):
+        """Id ингредиентов пачки по (название, единица) с созданием новых"""
+        keys = {(item['name'], item['measurement_unit'])
+                for record in records for item in record['ingredients']}
+        missing = keys - self.ingredients.keys()
+        if missing:
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in missing])
+            for pk, name, unit in Ingredient.objects.filter(
+                    name__in={name for name, _ in missing}).order_by(
+                        '-pk').values_list('id', 'name', 'measurement_unit'):
+                self.ingredients[name, unit] = pk
+            self.ingredients_created += len(missing)
+
+    def get_image(self, record):
+        """Имя файла изображения, при необходимости сохранённого из base64"""
+        if 'image_data' not in record:
+            return record.get('image', '')
+        extension = posixpath.splitext(record.get('image', ''))[1] or '.jpg'
+        return self.storage.save(
+            IMAGES_DIR + 'import' + extension,
+            ContentFile(base64.b64decode(record['image_data'])))
+
+    def import_batch(self, records):
+        """Метод загрузки пачки рецептов, возвращает число созданных"""
+        authors = dict(User.objects.filter(
+            email__in={record['author'] for record in records}).values_list(
+                'email', 'id'))
+        existing = set(Recipe.objects.filter(
+            author_id__in=authors.values(),
+            name__in={record['name'] for record in records},
+        ).values_list('author_id', 'name'))
+        new_records = {}
+        for record in records:
+            key = (authors.get(record['author']), record['name'])
+            if key[0] is None or key in existing or key in new_records:
+                self.skipped += 1
+                continue
+            new_records[key] = record
+        if not new_records:
+            return 0
+        self.get_ingredient_ids(new_records.values())
+        with transaction.atomic():
+            Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=author_id, name=name, text=record['text'],
+                    cooking_time=record['cooking_time'],
+                    image=self.get_image(record),
+                    tags_mask=get_tags_mask(
+                        self.tags[slug] for slug in record['tags']
+                        if slug in self.tags),
+                ) for (author_id, name), record in new_records.items()
+            ])
+            recipes = {
+                (recipe.author_id, recipe.name): recipe
+                for recipe in Recipe.objects.filter(
+                    author_id__in={key[0] for key in new_records},
+                    name__in={key[1] for key in new_records},
+                ).only('id', 'author_id', 'name', 'pub_date')
+                if (recipe.author_id, recipe.name) in new_records
+            }
+            tags = []
+            amounts = defaultdict(int)
+            dated = []
+            for key, record in new_records.items():
+                recipe = recipes[key]
+                tags.extend(
+                    TagRecipe(recipe_id=recipe.id, tag_id=self.tags[slug])
+                    for slug in set(record['tags']) if slug in self.tags)
+                for item in record['ingredients']:
+                    amounts[recipe.id, self.ingredients[
+                        item['name'], item['measurement_unit']]] += int(
+                            item['amount'])
+                if record.get('pub_date'):
+                    recipe.pub_date = parse_datetime(record['pub_date'])
+                    dated.append(recipe)
+            TagRecipe.objects.bulk_create(tags)
+            IngredientRecipe.objects.bulk_create([
+                IngredientRecipe(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id, amount=amount)
+                for (recipe_id, ingredient_id), amount in amounts.items()
+            ])
+            Recipe.objects.bulk_update(dated, ('pub_date',))
+            created = defaultdict(int)
+            for author_id, _ in new_records:
+                created[author_id] += 1
+            for author_id, count in created.items():
+                change_counter(User, author_id, 'recipes_count', count)
+            update_search_vectors(
+                [recipe.id for recipe in recipes.values()])
+        return len(new_records)
+
+    def handle(self, *args, **options):
+        self.storage = Recipe._meta.get_field('image').storage
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in Ingredient.objects.order_by(
+                '-pk').values_list('id', 'name', 'measurement_unit')
+        }
+        self.ingredients_created = 0
+        self.skipped = 0
+        source = (sys.stdin if options['path'] == '-'
+                  else open(options['path'], encoding='utf-8'))
+        started = time.monotonic()
+        imported = 0
+        try:
+            records = self.read_records(source)
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                imported += self.import_batch(batch)
+                elapsed = time.monotonic() - started
+                logging.info(
+                    f'Загружено рецептов: {imported} '
+                    f'({imported / max(elapsed, 1e-6):.0f} в секунду)')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            bump_version('recipes')
+            recipe_ingredient_index.invalidate()
+            if self.ingredients_created:
+                ingredients_cache.invalidate()
+        elapsed = time.monotonic() - started
+        logging.info(
+            f'Загрузка завершена за {elapsed:.1f} с: создано рецептов '
+            f'{imported}, пропущено {self.skipped}, новых ингредиентов '
+            f'{self.ingredients_created}. Копии изображений создаёт '
+            f'команда build_renditions')
@@ -1,39 +1,128 @@
+import csv
+import json
 import logging
 import os.path
-from csv import DictReader
+from itertools import islice
 
 from django.core.management import BaseCommand
+from django.db import transaction
 
+from api.cache import ingredients_cache, tags_cache
 from recipes.models import Ingredient, Tag
 
 DATA_DIR = 'data/'
 DATA_PATCH = {
     'ingredients': os.path.join(DATA_DIR, 'ingredients.csv'),
-    'tags': os.path.join(DATA_DIR, 'tags.csv'),
+    'tags': os.path.join(DATA_DIR, 'tags.json'),
 }
 
 logging.getLogger().setLevel(logging.INFO)
 
 
+def read_rows(path, fields):
+    """Построчное чтение справочника из CSV или JSON.
+
+    CSV может быть как с заголовком, так и без него - тогда колонки
+    идут в порядке fields.
+    """
+    with open(path, encoding='utf-8') as data_file:
+        if path.endswith('.json'):
+            for row in json.load(data_file):
+                yield {field: row[field] for field in fields}
+            return
+        for values in csv.reader(data_file):
+            if not values or values == list(fields):
+                continue
+            yield dict(zip(fields, values))
+
+
 class Command(BaseCommand):
-    """ Команда для загрузки данных в БД"""
+    """ Команда для загрузки данных в БД.
 
-    def handle(self, *args, **options):
-        Ingredient.objects.bulk_create(
-            [Ingredient(id=row['id'], name=row['name'],
-                        measurement_unit=row['measurement_unit'])
-             for row in DictReader(
-                open(DATA_PATCH['ingredients'], encoding='utf-8'))
-             ]
-        )
+    Справочники синхронизируются с файлами по естественному ключу:
+    новые строки добавляются, изменённые обновляются, а с --prune
+    удаляются отсутствующие в файле и не используемые в рецептах.
+    Повторный запуск на тех же файлах ничего не меняет.
+    """
 
-        logging.info('База Ингредиентов загружена')
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', default=DATA_PATCH['ingredients'])
+        parser.add_argument('--tags', default=DATA_PATCH['tags'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалить строки, которых нет в файле')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет изменено')
+
+    def sync(self, model, key_fields, update_fields, rows, unused):
+        """Метод синхронизации таблицы model со строками файла.
 
-        Tag.objects.bulk_create(
-            [Tag(id=row['id'], name=row['name'], color=row['color'],
-                 slug=row['slug'])
-             for row in DictReader(open(DATA_PATCH['tags'], encoding='utf-8'))
-             ]
-        )
+        unused - queryset строк, которые можно удалить при --prune.
+        Возвращает число добавленных, обновлённых и удалённых строк.
+        """
+        existing = {}
+        for obj in model.objects.order_by('-pk').only(
+                'pk', *key_fields, *update_fields).iterator():
+            existing[tuple(getattr(obj, field) for field in key_fields)] = obj
+        created, updated, seen = [], [], set()
+        for row in rows:
+            key = tuple(row[field] for field in key_fields)
+            if key in seen:
+                continue
+            seen.add(key)
+            obj = existing.get(key)
+            if obj is None:
+                created.append(model(**row))
+            elif any(getattr(obj, field) != row[field]
+                     for field in update_fields):
+                for field in update_fields:
+                    setattr(obj, field, row[field])
+                updated.append(obj)
+        stale = [obj.pk for key, obj in existing.items() if key not in seen]
+        deleted = 0
+        if self.options['prune'] and stale:
+            stale_ids = iter(stale)
+            while True:
+                batch = list(islice(stale_ids, self.options['batch_size']))
+                if not batch:
+                    break
+                if self.options['dry_run']:
+                    deleted += unused.filter(pk__in=batch).count()
+                else:
+                    deleted += unused.filter(pk__in=batch).delete()[0]
+        if not self.options['dry_run']:
+            model.objects.bulk_create(
+                created, batch_size=self.options['batch_size'])
+            if updated:
+                model.objects.bulk_update(
+                    updated, update_fields,
+                    batch_size=self.options['batch_size'])
+        name = model._meta.verbose_name_plural
+        logging.info(
+            f'{name}: добавлено {len(created)}, обновлено {len(updated)}, '
+            f'удалено {deleted}, нет в файле {len(stale)}')
+        return len(created), len(updated), deleted
 
+    def handle(self, *args, **options):
+        self.options = options
+        with transaction.atomic():
+            ingredients_changed = any(self.sync(
+                Ingredient, ('name', 'measurement_unit'), (),
+                read_rows(options['ingredients'],
+                          ('name', 'measurement_unit')),
+                Ingredient.objects.filter(ingredient_for_recipe=None),
+            ))
+            tags_changed = any(self.sync(
+                Tag, ('slug',), ('name', 'color'),
+                read_rows(options['tags'], ('name', 'color', 'slug')),
+                Tag.objects.filter(tagrecipe=None),
+            ))
+        if options['dry_run']:
+            logging.info('Пробный запуск: база не изменена')
+            return
+        if ingredients_changed:
+            ingredients_cache.invalidate()
+        logging.info('База Ингредиентов загружена')
+        if tags_changed:
+            tags_cache.invalidate()
         logging.info('База Тегов загружена')
@@ -0,0 +1,24 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from recipes.counters import recount_counters, recount_tags_masks
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для сверки и исправления счётчиков"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        drift = recount_counters(dry_run=options['dry_run'])
+        drift['recipes.Recipe.tags_mask'] = recount_tags_masks(
+            dry_run=options['dry_run'])
+        for counter, stale in drift.items():
+            logging.info(f'{counter}: расхождений {stale}')
+        if not options['dry_run']:
+            logging.info('Счётчики исправлены')
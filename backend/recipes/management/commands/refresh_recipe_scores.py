@@ -0,0 +1,20 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from api.cache import recipe_feed_cache
+from recipes.scores import refresh_scores
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта рейтингов рецептов, запускается по расписанию"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        refresh_scores(options['batch_size'])
+        recipe_feed_cache.invalidate()
+        logging.info('Рейтинги рецептов пересчитаны')
@@ -0,0 +1,24 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.recommendations import refresh_recommendations
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта похожих рецептов и рекомендаций,
+       запускается по расписанию
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recipes, users = refresh_recommendations(options['batch_size'])
+        logging.info(
+            f'Рекомендации пересчитаны: рецептов {recipes}, '
+            f'пользователей {users} за {time.monotonic() - started:.1f} с')
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'carts_count',
+     'shopping_cart', 'ShoppingCart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'subscribers_count',
+     'recipes', 'Subscription', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, related_app, related_name, related_field in (
+            COUNTERS):
+        related = apps.get_model(related_app, related_name)
+        apps.get_model(app, name).objects.update(**{field: Coalesce(Subquery(
+            related.objects.filter(
+                **{related_field: OuterRef('pk')},
+            ).order_by().values(related_field).annotate(
+                total=Count('pk'),
+            ).values('total'),
+            output_field=IntegerField(),
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_auto_20230622_1003'),
+        ('shopping_cart', '0005_shoppinglistitem'),
+        ('users', '0004_add_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Пользователей, добавили в корзину'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Пользователей, добавили в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_add_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Загрузите изображение', storage=recipes.storage.ContentHashStorage(), upload_to='recipes/images/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_add_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='similar_recipes',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Похожие рецепты'),
+        ),
+    ]
@@ -1,7 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.utils import timezone
 
 from users.models import User
+from .storage import recipe_image_storage
 
 MIN_VALUE = 1
 
@@ -9,6 +12,17 @@ MESSAGE_ERR_TIME = 'Время приготовления должно быть
 
 MESSAGE_ERR_AMOUNT = 'Количество ингредиентов должно быть больше ноля.'
 
+TAGS_MASK_BITS = 63
+
+
+def get_tags_mask(tag_ids):
+    """Битовая маска тегов рецепта; теги с id от TAGS_MASK_BITS не входят"""
+    mask = 0
+    for tag_id in tag_ids:
+        if int(tag_id) < TAGS_MASK_BITS:
+            mask |= 1 << int(tag_id)
+    return mask
+
 
 class Ingredient(models.Model):
     """Модель ингредиентов"""
@@ -55,8 +69,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Изображение',
         upload_to='recipes/images/',
+        storage=recipe_image_storage,
         help_text='Загрузите изображение'
     )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict, blank=True, editable=False)
     text = models.TextField(verbose_name='Описание рецепта')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -65,17 +83,67 @@ class Recipe(models.Model):
         verbose_name='Время приготовления',
         validators=[MinValueValidator(MIN_VALUE, message=MESSAGE_ERR_TIME)])
     tags = models.ManyToManyField(Tag, through='TagRecipe')
+    tags_mask = models.BigIntegerField(
+        verbose_name='Битовая маска тегов', default=0, editable=False)
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name='Дата публикации')
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Пользователей, добавили в избранное', default=0)
+    carts_count = models.PositiveIntegerField(
+        verbose_name='Пользователей, добавили в корзину', default=0)
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор', null=True, editable=False)
+    popularity_score = models.FloatField(
+        verbose_name='Популярность', default=0)
+    trending_score = models.FloatField(
+        verbose_name='Популярность за последнее время', default=0)
+    similar_recipes = models.JSONField(
+        verbose_name='Похожие рецепты', default=list, blank=True,
+        editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=('-popularity_score', '-pub_date'),
+                         name='recipe_popularity_idx'),
+            models.Index(fields=('-trending_score', '-pub_date'),
+                         name='recipe_trending_idx'),
+            models.Index(fields=('cooking_time', '-pub_date'),
+                         name='recipe_cooking_time_idx'),
+        ]
+        # GIN-индекс по search_vector создаётся миграцией 0019 только
+        # в PostgreSQL, поэтому здесь не объявлен.
         verbose_name = 'Рецепты'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        recipe._saved_image = recipe.__dict__.get('image')
+        return recipe
+
+    def save(self, *args, **kwargs):
+        """Метод сохранения рецепта.
+
+        При смене изображения копии старого сбрасываются тем же запросом,
+        что записывает новое; новые копии создаёт обработчик post_save.
+        """
+        update_fields = kwargs.get('update_fields')
+        self._image_changed = (
+            'image' in self.__dict__
+            and (update_fields is None or 'image' in update_fields)
+            and self.image.name != getattr(self, '_saved_image', None))
+        if self._image_changed:
+            self.image_renditions = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'image_renditions'}
+        super().save(*args, **kwargs)
+        if 'image' in self.__dict__:
+            self._saved_image = self.image.name
+
 
 class IngredientRecipe(models.Model):
     """Модель ингредиентов определённого рецепта"""
@@ -113,6 +181,8 @@ class TagRecipe(models.Model):
             fields=['recipe', 'tag'],
             name='unique_tag',
         )]
+        indexes = [models.Index(fields=('tag', 'recipe'),
+                                name='tagrecipe_tag_recipe_idx')]
         verbose_name = 'Теги для рецепта'
         verbose_name_plural = 'Теги для рецепта'
 
@@ -120,6 +190,112 @@ class TagRecipe(models.Model):
         return f'{self.recipe} - {self.tag}'
 
 
+class UserRelationManager(models.Manager):
+    """Менеджер связей пользователя с рецептом или автором.
+
+    Добавление и удаление выполняются одним запросом и опираются на
+    уникальное ограничение пары, поэтому повторный запрос не создаёт
+    дубль даже при одновременных обращениях.
+    """
+
+    def __init__(self, target_field):
+        super().__init__()
+        self.target_field = target_field
+
+    def get_columns(self):
+        """Таблица и колонки пары (пользователь, объект) в кавычках"""
+        quote_name = connections[self.db].ops.quote_name
+        meta = self.model._meta
+        return (quote_name(meta.db_table),
+                quote_name(meta.get_field('user').column),
+                quote_name(meta.get_field(self.target_field).column))
+
+    def get_created_fields(self):
+        """Поля с auto_now_add, которые INSERT заполняет сам"""
+        return [field for field in self.model._meta.concrete_fields
+                if getattr(field, 'auto_now_add', False)]
+
+    def supports_returning(self):
+        """Поддерживает ли база ON CONFLICT и RETURNING"""
+        connection = connections[self.db]
+        return connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35))
+
+    def add_many(self, user_id, target_ids):
+        """Метод добавления связей одним INSERT.
+
+        Возвращает множество id объектов, связи с которыми созданы;
+        уже существующие связи пропускаются.
+        """
+        target_ids = list(dict.fromkeys(target_ids))
+        if not target_ids:
+            return set()
+        if not self.supports_returning():
+            existing = set(self.filter(
+                user_id=user_id, **{f'{self.target_field}_id__in': target_ids},
+            ).values_list(f'{self.target_field}_id', flat=True))
+            self.bulk_create([
+                self.model(user_id=user_id,
+                           **{f'{self.target_field}_id': target_id})
+                for target_id in target_ids if target_id not in existing
+            ], ignore_conflicts=True)
+            return set(target_ids) - existing
+        connection = connections[self.db]
+        table, user_column, target_column = self.get_columns()
+        created_fields = self.get_created_fields()
+        columns = ', '.join([
+            user_column, target_column,
+            *(connection.ops.quote_name(field.column)
+              for field in created_fields)])
+        created = [field.get_db_prep_save(timezone.now(), connection)
+                   for field in created_fields]
+        placeholders = '(' + ', '.join(['%s'] * (2 + len(created))) + ')'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'VALUES {", ".join([placeholders] * len(target_ids))} '
+                f'ON CONFLICT DO NOTHING RETURNING {target_column}',
+                [value for target_id in target_ids
+                 for value in (user_id, target_id, *created)],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def remove_many(self, user_id, target_ids):
+        """Метод удаления связей одним DELETE.
+
+        Возвращает множество id объектов, связи с которыми удалены.
+        """
+        target_ids = list(dict.fromkeys(target_ids))
+        if not target_ids:
+            return set()
+        relations = self.filter(
+            user_id=user_id, **{f'{self.target_field}_id__in': target_ids})
+        if not self.supports_returning():
+            removed = set(relations.values_list(
+                f'{self.target_field}_id', flat=True))
+            relations._raw_delete(self.db)
+            return removed
+        table, user_column, target_column = self.get_columns()
+        placeholders = ', '.join(['%s'] * len(target_ids))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {target_column} IN ({placeholders}) '
+                f'RETURNING {target_column}',
+                (user_id, *target_ids),
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def add(self, user_id, target_id):
+        """Метод добавления связи, возвращает False, если она уже есть"""
+        return bool(self.add_many(user_id, [target_id]))
+
+    def remove(self, user_id, target_id):
+        """Метод удаления связи, возвращает число удалённых строк"""
+        return len(self.remove_many(user_id, [target_id]))
+
+
 class Favorite(models.Model):
     """Модель избранного рецепта"""
 
@@ -129,12 +305,19 @@ class Favorite(models.Model):
     recipe = models.ForeignKey(
         Recipe, verbose_name='Избранный рецепт', on_delete=models.CASCADE,
         related_name='recipe_in_favorite')
+    created = models.DateTimeField(
+        verbose_name='Дата добавления', auto_now_add=True)
+
+    objects = models.Manager()
+    relations = UserRelationManager('recipe')
 
     class Meta:
         constraints = [models.UniqueConstraint(
             fields=['user', 'recipe'],
             name='unique_favorite',
         )]
+        indexes = [models.Index(fields=('created',),
+                                name='favorite_created_idx')]
         verbose_name = 'Любимый рецепт'
         verbose_name_plural = 'Любимый рецепт'
 
@@ -152,6 +335,9 @@ class Subscription(models.Model):
         User, verbose_name='Подписан на:', on_delete=models.CASCADE,
         related_name='author_recipes')
 
+    objects = models.Manager()
+    relations = UserRelationManager('author')
+
     class Meta:
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'],
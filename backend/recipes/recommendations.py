@@ -0,0 +1,128 @@
+"""Похожие и рекомендованные рецепты по неявным оценкам пользователей."""
+import heapq
+import math
+from collections import defaultdict
+from itertools import combinations
+
+from django.db import transaction
+
+from shopping_cart.models import ShoppingCart
+from users.models import User
+from .models import Favorite, IngredientRecipe, Recipe
+
+FAVORITE_WEIGHT = 1.0
+CART_WEIGHT = 0.5
+COOCCURRENCE_SHARE = 0.7
+SIMILAR_LIMIT = 10
+RECOMMENDED_LIMIT = 20
+# Пользователи и ингредиенты с очень длинными списками почти не
+# различают рецепты, а пар дают квадратично много.
+MAX_USER_RECIPES = 300
+MAX_INGREDIENT_RECIPES = 1000
+
+
+def get_user_weights():
+    """Веса рецептов для каждого пользователя по избранному и корзине"""
+    weights = defaultdict(dict)
+    for model, weight in ((ShoppingCart, CART_WEIGHT),
+                          (Favorite, FAVORITE_WEIGHT)):
+        for user_id, recipe_id in model.objects.values_list(
+                'user_id', 'recipe_id').iterator():
+            weights[user_id][recipe_id] = weight
+    return weights
+
+
+def get_cooccurrence(user_weights):
+    """Косинусная близость рецептов по совместным оценкам пользователей"""
+    pairs = defaultdict(float)
+    norms = defaultdict(float)
+    for recipes in user_weights.values():
+        if len(recipes) > MAX_USER_RECIPES:
+            continue
+        for recipe_id, weight in recipes.items():
+            norms[recipe_id] += weight * weight
+        for (first, first_weight), (second, second_weight) in combinations(
+                sorted(recipes.items()), 2):
+            pairs[first, second] += first_weight * second_weight
+    return {
+        pair: value / math.sqrt(norms[pair[0]] * norms[pair[1]])
+        for pair, value in pairs.items()
+    }
+
+
+def get_ingredient_overlap():
+    """Коэффициент Жаккара для рецептов с общими ингредиентами"""
+    postings = defaultdict(list)
+    sizes = defaultdict(int)
+    for ingredient_id, recipe_id in IngredientRecipe.objects.values_list(
+            'ingredient_id', 'recipe_id').order_by('recipe_id').iterator():
+        postings[ingredient_id].append(recipe_id)
+        sizes[recipe_id] += 1
+    shared = defaultdict(int)
+    for recipe_ids in postings.values():
+        if len(recipe_ids) > MAX_INGREDIENT_RECIPES:
+            continue
+        for pair in combinations(recipe_ids, 2):
+            shared[pair] += 1
+    return {
+        pair: count / (sizes[pair[0]] + sizes[pair[1]] - count)
+        for pair, count in shared.items()
+    }
+
+
+def get_similarity(user_weights):
+    """Соседи каждого рецепта с итоговой оценкой близости"""
+    cooccurrence = get_cooccurrence(user_weights)
+    overlap = get_ingredient_overlap()
+    neighbours = defaultdict(list)
+    for pair in cooccurrence.keys() | overlap.keys():
+        score = (COOCCURRENCE_SHARE * cooccurrence.get(pair, 0)
+                 + (1 - COOCCURRENCE_SHARE) * overlap.get(pair, 0))
+        first, second = pair
+        neighbours[first].append((score, second))
+        neighbours[second].append((score, first))
+    return {
+        recipe_id: heapq.nlargest(SIMILAR_LIMIT, scored)
+        for recipe_id, scored in neighbours.items()
+    }
+
+
+def get_recommended(recipes, similarity, own_recipes):
+    """Рецепты, близкие к оценённым пользователем, кроме уже известных"""
+    scores = defaultdict(float)
+    for recipe_id, weight in recipes.items():
+        for score, similar_id in similarity.get(recipe_id, ()):
+            if similar_id not in recipes and similar_id not in own_recipes:
+                scores[similar_id] += weight * score
+    return [recipe_id for _, recipe_id in heapq.nlargest(
+        RECOMMENDED_LIMIT,
+        ((score, recipe_id) for recipe_id, score in scores.items()))]
+
+
+def refresh_recommendations(batch_size=1000):
+    """Метод пересчёта похожих рецептов и рекомендаций пользователям.
+
+    Возвращает число обновлённых рецептов и пользователей.
+    """
+    user_weights = get_user_weights()
+    similarity = get_similarity(user_weights)
+    own_recipes = defaultdict(set)
+    for author_id, recipe_id in Recipe.objects.values_list(
+            'author_id', 'id').iterator():
+        own_recipes[author_id].add(recipe_id)
+    recipes = [
+        Recipe(id=recipe_id, similar_recipes=[
+            similar_id for _, similar_id in similarity.get(recipe_id, ())])
+        for recipe_id in Recipe.objects.values_list('id', flat=True)
+    ]
+    users = [
+        User(id=user_id, recommended_recipes=get_recommended(
+            user_weights.get(user_id, {}), similarity, own_recipes[user_id]))
+        for user_id in User.objects.values_list('id', flat=True)
+    ]
+    with transaction.atomic():
+        Recipe.objects.bulk_update(
+            recipes, ('similar_recipes',), batch_size=batch_size)
+        User.objects.bulk_update(
+            users, ('recommended_recipes',), batch_size=batch_size)
+    return len(recipes), len(users)
@@ -0,0 +1,68 @@
+"""Рейтинги рецептов для сортировки по популярности."""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from shopping_cart.models import ShoppingCart
+from .models import Favorite, Recipe
+
+CART_WEIGHT = 1
+FAVORITE_WEIGHT = 2
+TRENDING_GRAVITY = 1.5
+TRENDING_OFFSET_HOURS = 2
+TRENDING_WINDOW = timedelta(days=7)
+
+
+def get_event_score(weight, created, now):
+    """Вклад добавления в избранное или корзину, затухающий с его
+       возрастом
+    """
+    age_hours = max((now - created).total_seconds() / 3600, 0)
+    return weight / (age_hours + TRENDING_OFFSET_HOURS) ** TRENDING_GRAVITY
+
+
+def get_trending_scores(now):
+    """Популярность рецептов за TRENDING_WINDOW по времени добавлений.
+
+    Добавления группируются в базе по часу, поэтому число строк
+    не зависит от числа пользователей; возраст отсчитывается от
+    середины часа.
+    """
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, FAVORITE_WEIGHT),
+                          (ShoppingCart, CART_WEIGHT)):
+        events = model.objects.filter(
+            created__gte=now - TRENDING_WINDOW,
+        ).annotate(hour=TruncHour('created')).values(
+            'recipe_id', 'hour').annotate(count=Count('id')).order_by()
+        for row in events.iterator():
+            scores[row['recipe_id']] += row['count'] * get_event_score(
+                weight, row['hour'] + timedelta(minutes=30), now)
+    return scores
+
+
+def refresh_scores(batch_size=1000):
+    """Метод пересчёта рейтингов по счётчикам и времени добавлений.
+
+    Записываются только рецепты, рейтинг которых изменился.
+    """
+    now = timezone.now()
+    popularity = (F('favorites_count') * FAVORITE_WEIGHT
+                  + F('carts_count') * CART_WEIGHT)
+    scores = get_trending_scores(now)
+    with transaction.atomic():
+        Recipe.objects.exclude(popularity_score=popularity).update(
+            popularity_score=popularity)
+        current = dict(Recipe.objects.exclude(trending_score=0).values_list(
+            'id', 'trending_score'))
+        stale = [
+            Recipe(id=pk, trending_score=scores.get(pk, 0))
+            for pk in current.keys() | scores.keys()
+            if current.get(pk, 0) != scores.get(pk, 0)
+        ]
+        Recipe.objects.bulk_update(
+            stale, ('trending_score',), batch_size=batch_size)
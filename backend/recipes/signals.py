@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .images import schedule_renditions
+from .models import Recipe
+
+# Отправляется с recipe_id, когда меняется набор ингредиентов рецепта.
+recipe_ingredients_changed = Signal()
+
+
+@receiver(post_save, sender=Recipe)
+def create_renditions(instance, **kwargs):
+    """Создание копий изображения после смены изображения рецепта"""
+    if getattr(instance, '_image_changed', False) and instance.image:
+        schedule_renditions(instance)
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def touch(storage, name):
+    """Метод обновления времени изменения уже сохранённого файла.
+
+    cleanup_media не удаляет свежие файлы, поэтому повторно
+    используемый файл нужно пометить как только что записанный.
+    """
+    try:
+        os.utime(storage.path(name))
+    except (NotImplementedError, FileNotFoundError):
+        pass
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по хэшу их содержимого.
+
+    Повторная загрузка тех же байтов возвращает имя уже сохранённого
+    файла без записи на диск, обновляя только время его изменения.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, file_name = posixpath.split(name)
+        extension = posixpath.splitext(file_name)[1].lower()
+        name = posixpath.join(directory, digest.hexdigest() + extension)
+        if self.exists(name):
+            touch(self, name)
+            return name
+        return super().save(name, content, max_length)
+
+
+recipe_image_storage = ContentHashStorage()
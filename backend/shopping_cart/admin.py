@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from .models import ShoppingCart
+from .models import ShoppingCart, ShoppingListItem
 
 admin.site.register(ShoppingCart)
+admin.site.register(ShoppingListItem)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ShoppingCartConfig(AppConfig):
     name = 'shopping_cart'
+
+    def ready(self):
+        from . import signals  # noqa: F401
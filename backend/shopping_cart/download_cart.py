@@ -1,37 +1,124 @@
-from collections import defaultdict
+import csv
+import json
+from io import BytesIO
+from pathlib import Path
 
-from django.db.models import Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
 
-from recipes.models import IngredientRecipe
+from .models import ShoppingListItem
 
+PDF_FONT = 'DejaVuSans'
+PDF_FONT_PATH = Path(__file__).resolve().parent / 'fonts' / 'DejaVuSans.ttf'
+PDF_FONT_SIZE = 12
+PDF_LEADING = 18
+PDF_MARGIN = 2 * cm
 
-def download_ingredients(user):
-    """Метод для формирования списка покупок"""
-    ingredients = defaultdict(int)
+pdfmetrics.registerFont(TTFont(PDF_FONT, PDF_FONT_PATH))
 
-    ingredient_recipes = IngredientRecipe.objects.filter(
-        recipe__recipe_cart__user=user,
-    ).values(
+
+class Echo:
+    """Псевдофайл, возвращающий записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def get_cart_ingredients(user):
+    """Метод получения суммарного количества ингредиентов из корзины"""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient_id',
         'ingredient__name',
         'ingredient__measurement_unit',
-    ).annotate(
-        total_amount=Sum('amount'),
-    )
+        'total_amount',
+    ).order_by('ingredient__name').iterator()
+
+
+def format_ingredient(count, ingredient):
+    """Метод получения строки списка покупок для ингредиента"""
+    return (f'{count}. {ingredient["ingredient__name"]}, '
+            f'{ingredient["ingredient__measurement_unit"]} - '
+            f'{ingredient["total_amount"]}')
+
+
+def stream_txt(ingredients):
+    """Генератор списка покупок в текстовом виде"""
+    yield 'Список покупок:\n'
+    for count, ingredient in enumerate(ingredients, 1):
+        yield format_ingredient(count, ingredient) + '\n'
+    yield '\n\n Foodgram ©'
+
+
+def stream_csv(ingredients):
+    """Генератор списка покупок в формате CSV"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['ingredient__name'],
+                               ingredient['ingredient__measurement_unit'],
+                               ingredient['total_amount']))
+
+
+def stream_json(ingredients):
+    """Генератор списка покупок в формате JSON"""
+    separator = ''
+    yield '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['total_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def stream_pdf(ingredients):
+    """Генератор списка покупок в формате PDF.
+
+    Страницы собираются по одной по мере чтения курсора, но файл
+    отдаётся после последней: таблица ссылок PDF пишется в конце
+    документа и содержит смещения всех страниц.
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    line_width = width - 2 * PDF_MARGIN
+    pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+    top = height - PDF_MARGIN
+    pdf.drawString(PDF_MARGIN, top, 'Список покупок:')
+    top -= 2 * PDF_LEADING
+    for count, ingredient in enumerate(ingredients, 1):
+        for line in simpleSplit(format_ingredient(count, ingredient),
+                                PDF_FONT, PDF_FONT_SIZE, line_width):
+            if top < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+                top = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, top, line)
+            top -= PDF_LEADING
+    pdf.drawString(PDF_MARGIN, PDF_MARGIN / 2, 'Foodgram ©')
+    pdf.save()
+    yield buffer.getvalue()
 
-    ingredients_to_file = 'Список покупок:\n'
-    count = 1
 
-    for ingredient in ingredient_recipes:
-        name = ingredient['ingredient__name']
-        measurement_unit = ingredient['ingredient__measurement_unit']
-        total_amount = ingredient['total_amount']
-        ingredient_str = f'{name}, {measurement_unit}'
-        ingredients[ingredient_str] = total_amount
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', stream_txt),
+    'csv': ('text/csv; charset=utf-8', stream_csv),
+    'json': ('application/json', stream_json),
+    'pdf': ('application/pdf', stream_pdf),
+}
 
-    for key, value in ingredients.items():
-        ingredients_to_file += f'{count}. {key} - {value}\n'
-        count += 1
 
-    ingredients_to_file += '\n\n Foodgram ©'
+def download_ingredients(user, file_format='txt'):
+    """Метод для формирования списка покупок.
 
-    return ingredients_to_file
+    Возвращает тип содержимого и генератор частей файла, который читает
+    строки из курсора по мере отправки ответа.
+    """
+    content_type, stream = SHOPPING_LIST_FORMATS[file_format]
+    return content_type, stream(get_cart_ingredients(user))
@@ -0,0 +1,20 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from shopping_cart.shopping_list import rebuild_shopping_lists
+
+logging.getLogger().setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта списков покупок по корзинам"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids',
+                            help='id пользователя, можно указать несколько')
+
+    def handle(self, *args, **options):
+        rebuild_shopping_lists(options['user_ids'])
+        logging.info('Списки покупок пересчитаны')
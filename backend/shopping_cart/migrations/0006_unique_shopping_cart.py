@@ -0,0 +1,53 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def remove_duplicates(apps, schema_editor):
+    """Удаление повторов в корзинах с пересчётом зависимых данных"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingCart = apps.get_model('shopping_cart', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('shopping_cart', 'ShoppingListItem')
+    duplicates = ShoppingCart.objects.values('user_id', 'recipe_id').annotate(
+        first_id=Min('id'), total=Count('id')).filter(total__gt=1).order_by()
+    user_ids, recipe_ids = set(), set()
+    for row in duplicates:
+        ShoppingCart.objects.filter(
+            user_id=row['user_id'], recipe_id=row['recipe_id'],
+        ).exclude(id=row['first_id']).delete()
+        user_ids.add(row['user_id'])
+        recipe_ids.add(row['recipe_id'])
+    if not user_ids:
+        return
+    for recipe in Recipe.objects.filter(id__in=recipe_ids):
+        recipe.carts_count = ShoppingCart.objects.filter(
+            recipe_id=recipe.id).count()
+        recipe.save(update_fields=('carts_count',))
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    totals = IngredientRecipe.objects.filter(
+        recipe__recipe_cart__user_id__in=user_ids,
+    ).values(
+        'recipe__recipe_cart__user_id', 'ingredient_id',
+    ).annotate(total=Sum('amount')).order_by()
+    ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=row['recipe__recipe_cart__user_id'],
+                          ingredient_id=row['ingredient_id'],
+                          total_amount=row['total']) for row in totals],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_add_counters'),
+        ('shopping_cart', '0005_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def set_created_from_pub_date(apps, schema_editor):
+    """Дата добавления существующих записей - дата публикации рецепта"""
+    ShoppingCart = apps.get_model('shopping_cart', 'ShoppingCart')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShoppingCart.objects.update(created=Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe_id')).values('pub_date')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_add_favorite_created'),
+        ('shopping_cart', '0006_unique_shopping_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            set_created_from_pub_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['created'], name='shopping_cart_created_idx'),
+        ),
+    ]
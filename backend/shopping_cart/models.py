@@ -1,6 +1,6 @@
 from django.db import models
 
-from recipes.models import Recipe
+from recipes.models import Ingredient, Recipe, UserRelationManager
 from users.models import User
 
 
@@ -19,10 +19,53 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='recipe_cart',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+    )
+
+    objects = models.Manager()
+    relations = UserRelationManager('recipe')
 
     class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='unique_shopping_cart',
+        )]
+        indexes = [models.Index(fields=('created',),
+                                name='shopping_cart_created_idx')]
         verbose_name = 'Корзина для покупок'
         verbose_name_plural = 'Корзина для покупок'
 
     def __str__(self):
         return f'{self.recipe} в корзине у {self.user}'
+
+
+class ShoppingListItem(models.Model):
+    """Модель суммарного количества ингредиента в списке покупок"""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Юзер',
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='in_shopping_lists',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Количество', default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='unique_shopping_list_item',
+        )]
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} у {self.user}: {self.total_amount}'
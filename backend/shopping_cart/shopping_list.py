@@ -0,0 +1,121 @@
+"""Поддержка материализованного списка покупок пользователей."""
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientRecipe
+from .models import ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Метод получения количества ингредиентов рецепта"""
+    return dict(IngredientRecipe.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+def change_shopping_lists(user_ids, amounts):
+    """Метод изменения списков покупок на величины amounts.
+
+    user_ids может содержать повторы: изменение применяется столько раз,
+    сколько раз пользователь указан. Строки блокируются select_for_update,
+    отсутствующие создаются заранее, опустевшие удаляются.
+    """
+    amounts = {pk: delta for pk, delta in amounts.items() if delta}
+    multipliers = Counter(user_ids)
+    if not amounts or not multipliers:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            [ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in multipliers
+             for ingredient_id, delta in amounts.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        items = list(ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=multipliers, ingredient_id__in=amounts))
+        for item in items:
+            item.total_amount = max(
+                item.total_amount
+                + amounts[item.ingredient_id] * multipliers[item.user_id],
+                0,
+            )
+        ShoppingListItem.objects.bulk_update(items, ('total_amount',))
+        ShoppingListItem.objects.filter(
+            pk__in=[item.pk for item in items if not item.total_amount]
+        ).delete()
+
+
+def get_recipes_amounts(recipe_ids):
+    """Метод получения суммарного количества ингредиентов рецептов"""
+    amounts = Counter()
+    for ingredient_id, amount in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id):
+    """Метод прибавления ингредиентов рецепта к списку покупок"""
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_id))
+
+
+def add_recipes_to_shopping_list(user_id, recipe_ids):
+    """Метод прибавления ингредиентов нескольких рецептов к списку покупок"""
+    change_shopping_lists([user_id], get_recipes_amounts(recipe_ids))
+
+
+def remove_recipes_from_shopping_list(user_id, recipe_ids):
+    """Метод вычитания ингредиентов нескольких рецептов из списка покупок"""
+    change_shopping_lists(
+        [user_id],
+        {pk: -amount
+         for pk, amount in get_recipes_amounts(recipe_ids).items()},
+    )
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id, count=1):
+    """Метод вычитания ингредиентов рецепта из списка покупок"""
+    change_shopping_lists(
+        [user_id] * count,
+        {pk: -amount for pk, amount in get_recipe_amounts(recipe_id).items()},
+    )
+
+
+def change_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    """Метод переноса изменения ингредиентов рецепта в списки покупок"""
+    amounts = {
+        pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+        for pk in old_amounts.keys() | new_amounts.keys()
+    }
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True)
+    change_shopping_lists(list(user_ids), amounts)
+
+
+def rebuild_shopping_lists(user_ids=None, batch_size=1000):
+    """Метод пересчёта списков покупок по корзинам пользователей"""
+    items = ShoppingListItem.objects.all()
+    carts = {'recipe__recipe_cart__isnull': False}
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        carts = {'recipe__recipe_cart__user_id__in': user_ids}
+    # Условия на корзину задаются одним filter(), иначе каждое добавит
+    # своё соединение и суммы умножатся.
+    ingredients = IngredientRecipe.objects.filter(**carts)
+    totals = ingredients.values(
+        'recipe__recipe_cart__user_id', 'ingredient_id',
+    ).annotate(total=Sum('amount')).order_by()
+    rows = totals.iterator(chunk_size=batch_size)
+    with transaction.atomic():
+        items.delete()
+        while True:
+            batch = [ShoppingListItem(
+                user_id=row['recipe__recipe_cart__user_id'],
+                ingredient_id=row['ingredient_id'],
+                total_amount=row['total'],
+            ) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            ShoppingListItem.objects.bulk_create(batch)
@@ -0,0 +1,19 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Recipe
+from .models import ShoppingCart
+from .shopping_list import change_shopping_lists, get_recipe_amounts
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe(instance, **kwargs):
+    """Вычитание удаляемого рецепта из списков покупок"""
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=instance).values_list('user_id', flat=True))
+    if user_ids:
+        change_shopping_lists(
+            user_ids,
+            {pk: -amount
+             for pk, amount in get_recipe_amounts(instance.pk).items()},
+        )
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_add_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recommended_recipes',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Рекомендованные рецепты'),
+        ),
+    ]
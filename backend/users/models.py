@@ -15,6 +15,13 @@ class User(AbstractUser):
     first_name = models.CharField(verbose_name='Имя', max_length=150)
     last_name = models.CharField(verbose_name='Фамилия', max_length=150)
     password = models.CharField(verbose_name='Пароль', max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов', default=0)
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков', default=0)
+    recommended_recipes = models.JSONField(
+        verbose_name='Рекомендованные рецепты', default=list, blank=True,
+        editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']